@@ -1,17 +1,31 @@
 """Main app."""
 
+import atexit
+import importlib
 import logging
 import os
+import signal
 import threading
 import warnings
 
 import telebot  # type: ignore[import-untyped]
 
 # kassa
+from data.storage import SQLiteStorage, SupabaseStorage
 from data.user_database import UserDatabase
 
 # Importing custom modules
+from modules.artifacts import ArtifactIndex
+from modules.cache import DiskCache, LRUCache
+from modules.event_loop import EventLoopThread
+from modules.outbox import Outbox
+from modules.prompts import PromptRegistry
+from modules.rendering import PdfRenderer
 from modules.request_queue import Queue
+from modules.reservations import TokenReservations
+from modules.warmup import warm_up
+from modules.webhook import WebhookServer
+from modules.workspace import remove_workspaces
 from routes.about import AboutRoute
 from routes.note import MainRoute
 from routes.prices import PricesRoute
@@ -38,35 +52,161 @@ s2t_auth_data = os.environ.get("S2T_AUTH_DATA", "")
 t2n_auth_data = os.environ.get("T2N_AUTH_DATA", "")
 shop_provider = os.environ.get("SHOP_PROVIDER", "")
 
+# Get bot mode variables
+bot_mode = os.environ.get("BOT_MODE", "polling")
+webhook_url = os.environ.get("WEBHOOK_URL", "")
+webhook_host = os.environ.get("WEBHOOK_HOST", "0.0.0.0")  # noqa: S104
+webhook_port = int(os.environ.get("WEBHOOK_PORT", "8443"))
+webhook_path = os.environ.get("WEBHOOK_PATH", "/telegram")
+webhook_secret = os.environ.get("WEBHOOK_SECRET", "")
+webhook_workers = int(os.environ.get("WEBHOOK_WORKERS", "8"))
+telegram_api_url = os.environ.get("TELEGRAM_API_URL", "")
+
+# Get outbox variables
+outbox_global_rate = float(os.environ.get("OUTBOX_GLOBAL_RATE", "25"))
+outbox_chat_rate = float(os.environ.get("OUTBOX_CHAT_RATE", "1"))
+outbox_workers = int(os.environ.get("OUTBOX_WORKERS", "8"))
+
+# Get storage variables
+storage_backend = os.environ.get("STORAGE_BACKEND", "supabase")
+sqlite_path = os.environ.get("SQLITE_PATH", "data/db/users.sqlite3")
+
 # Get model variables
 split_timeout = int(os.environ.get("SPLIT_TIMEOUT", "45"))
 queue_timeout = int(os.environ.get("QUEUE_TIMEOUT", "10"))
 queue_max_length = int(os.environ.get("QUEUE_MAX_LEN", "20"))
+queue_workers = int(os.environ.get("QUEUE_WORKERS", "1"))
+model_retries = int(os.environ.get("MODEL_RETRIES", "3"))
+hedge_after = float(os.environ.get("MODEL_HEDGE_AFTER", "0")) or None
+context_tokens = int(os.environ.get("MODEL_CONTEXT_TOKENS", "8192"))
+completion_tokens = int(os.environ.get("MODEL_COMPLETION_TOKENS", "2048"))
+summary_workers = int(os.environ.get("SUMMARY_WORKERS", "4"))
+render_workers = int(os.environ.get("RENDER_WORKERS", "2"))
+stream_notes = os.environ.get("STREAM_NOTES", "1") == "1"
+incremental_notes = os.environ.get("INCREMENTAL_NOTES", "0") == "1"
+async_pipeline = os.environ.get("ASYNC_PIPELINE", "0") == "1"
+async_max_connections = int(os.environ.get("ASYNC_MAX_CONNECTIONS", "100"))
+stt_concurrency = int(os.environ.get("STT_CONCURRENCY", "4"))
+intake_workers = int(os.environ.get("INTAKE_WORKERS", "4"))
+
+# Get cache variables
+transcript_cache_mb = int(os.environ.get("TRANSCRIPT_CACHE_MB", "256"))
+transcript_cache_ttl = int(os.environ.get("TRANSCRIPT_CACHE_TTL", "604800"))
+note_cache_mb = int(os.environ.get("NOTE_CACHE_MB", "256"))
+note_cache_ttl = int(os.environ.get("NOTE_CACHE_TTL", "604800"))
+artifact_cache_mb = int(os.environ.get("ARTIFACT_CACHE_MB", "512"))
+artifact_cache_ttl = int(os.environ.get("ARTIFACT_CACHE_TTL", "604800"))
+pdf_cache_mb = int(os.environ.get("PDF_CACHE_MB", "256"))
+pdf_cache_ttl = int(os.environ.get("PDF_CACHE_TTL", "604800"))
+user_cache_size = int(os.environ.get("USER_CACHE_SIZE", "10000"))
+user_cache_ttl = int(os.environ.get("USER_CACHE_TTL", "300"))
+registration_batch = int(os.environ.get("REGISTRATION_BATCH", "50"))
+registration_interval = float(os.environ.get("REGISTRATION_INTERVAL", "1.0"))
 
 # Check if all required environment variables are provided
 if not all(
     [
         telegram_bot_token,
-        supabase_url,
-        supabase_key,
+        storage_backend == "sqlite" or (supabase_url and supabase_key),
         s2t_auth_data,
         t2n_auth_data,
         shop_provider,
+        bot_mode == "polling" or (webhook_url and webhook_secret),
     ],
 ):
     error_message = "Missing environment variables."
     logger.error(error_message, "server")
     raise ValueError(error_message)
 
+# Create PDF renderer first: its workers are forked before other threads start
+renderer = PdfRenderer(
+    workers=render_workers,
+    cache=DiskCache(
+        "data/cache/pdf",
+        max_bytes=pdf_cache_mb * 1024 * 1024,
+        ttl=pdf_cache_ttl,
+    ),
+)
+
+# Create event loop for the model calls, after the renderer has forked
+event_loop = (
+    EventLoopThread(logger, max_connections=async_max_connections)
+    if async_pipeline
+    else None
+)
+
 # Create request queueNone
 queue = Queue(timeout=queue_timeout, max_length=queue_max_length, logger=logger)
 
+# Create transcript cache, keyed by audio hash
+transcript_cache = DiskCache(
+    "data/cache/transcripts",
+    max_bytes=transcript_cache_mb * 1024 * 1024,
+    ttl=transcript_cache_ttl,
+)
+
+# Create note cache, keyed by model, instruction and text hashes
+note_cache = DiskCache(
+    "data/cache/notes",
+    max_bytes=note_cache_mb * 1024 * 1024,
+    ttl=note_cache_ttl,
+)
+
+# Create index of finished notes, keyed by Telegram's file_unique_id
+artifacts = ArtifactIndex(
+    DiskCache(
+        "data/cache/artifacts",
+        max_bytes=artifact_cache_mb * 1024 * 1024,
+        ttl=artifact_cache_ttl,
+    ),
+)
+
+# Load instruction prompts, reloaded when their files change
+prompts = PromptRegistry(
+    {
+        "default": "data/instructions.txt",
+        "reduce": "data/reduce_instructions.txt",
+    },
+    logger=logger,
+)
+
 # Create user database instance
-database = UserDatabase(supabase_url, supabase_key, logger)
+storage = (
+    SQLiteStorage(sqlite_path)
+    if storage_backend == "sqlite"
+    else SupabaseStorage(supabase_url, supabase_key)
+)
+database = UserDatabase(
+    storage,
+    logger,
+    cache=LRUCache(max_entries=user_cache_size, ttl=user_cache_ttl),
+    registration_batch=registration_batch,
+    registration_interval=registration_interval,
+)
+if database.registrations is not None:
+    # Write users registered since the last flush before exit
+    atexit.register(database.registrations.flush)
+
+# Create token reservations, taken when a request is queued
+reservations = TokenReservations(database, logger)
+
 
+# Point the bot to another Bot API server, e.g. a local fake one for tests
+if telegram_api_url:
+    telebot.apihelper.API_URL = telegram_api_url.rstrip("/") + "/bot{0}/{1}"
+    telebot.apihelper.FILE_URL = telegram_api_url.rstrip("/") + "/file/bot{0}/{1}"
 
-# Create Telegram bot instance
-bot = telebot.TeleBot(telegram_bot_token)
+# Create Telegram bot instance, webhook updates are handled in the server's pool
+bot = telebot.TeleBot(telegram_bot_token, threaded=bot_mode != "webhook")
+
+# Create outbox for the messages about requests, within Telegram's flood limits
+outbox = Outbox(
+    bot,
+    logger,
+    global_rate=outbox_global_rate,
+    chat_rate=outbox_chat_rate,
+    workers=outbox_workers,
+)
 
 
 # Register route handlers
@@ -91,6 +231,23 @@ main_route = MainRoute(
     user_database=database,
     logger=logger,
     request_queue=queue,
+    prompts=prompts,
+    renderer=renderer,
+    reservations=reservations,
+    outbox=outbox,
+    model_retries=model_retries,
+    hedge_after=hedge_after,
+    context_tokens=context_tokens,
+    completion_tokens=completion_tokens,
+    summary_workers=summary_workers,
+    stream_notes=stream_notes,
+    incremental_notes=incremental_notes,
+    transcript_cache=transcript_cache,
+    note_cache=note_cache,
+    artifacts=artifacts,
+    event_loop=event_loop,
+    stt_concurrency=stt_concurrency,
+    intake_workers=intake_workers,
 )
 
 # Register unsupported route handler
@@ -104,9 +261,63 @@ if __name__ == "__main__":
     log_info = "App started."
     logger.info(log_info, extra={"message_type": "server"})
 
-    # Start bot and queue threads
-    bot_thread = threading.Thread(target=bot.infinity_polling)
-    queue_thread = threading.Thread(target=queue.run)
+    # Remove files of jobs interrupted by the previous run
+    remove_workspaces(logger)
+
+    # Jobs have separate workspaces, so several of them can run at once
+    queue_threads = [
+        threading.Thread(target=queue.run, name=f"queue-{index}")
+        for index in range(queue_workers)
+    ]
+
+    if bot_mode == "webhook":
+        # Receive updates over HTTP instead of long polling
+        server = WebhookServer(
+            bot=bot,
+            logger=logger,
+            host=webhook_host,
+            port=webhook_port,
+            path=webhook_path,
+            secret_token=webhook_secret,
+            workers=webhook_workers,
+        )
+        server.start()
+        bot.set_webhook(
+            url=webhook_url,
+            secret_token=webhook_secret,
+            max_connections=webhook_workers,
+        )
+    else:
+        # Updates are not delivered by polling while a webhook is set
+        bot.remove_webhook()
+        bot_thread = threading.Thread(target=bot.infinity_polling)
+        bot_thread.start()
+
+    for queue_thread in queue_threads:
+        queue_thread.start()
+
+    # Load slow dependencies after the bot starts instead of before it
+    warm_up(
+        {
+            "pydub": lambda: importlib.import_module("pydub"),
+            "storage": storage.connect,
+        },
+        logger=logger,
+    )
+
+    if bot_mode == "webhook":
+        # Drain on shutdown: finish accepted updates and the current request
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+        signal.signal(signal.SIGINT, lambda *_: stopped.set())
+        stopped.wait()
 
-    bot_thread.start()
-    queue_thread.start()
+        server.stop()
+        queue.stop()
+        for queue_thread in queue_threads:
+            queue_thread.join()
+        main_route.stop()
+        outbox.stop()
+        if event_loop is not None:
+            event_loop.stop()
+        logger.info("App stopped.", extra={"message_type": "server"})
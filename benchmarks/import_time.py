@@ -0,0 +1,99 @@
+"""Import-time benchmark.
+
+Reports the time spent importing the modules loaded before the bot starts
+polling, using `python -X importtime`. Run from the repository root:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --top 30 --modules pydub supabase
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import subprocess
+import sys
+from pathlib import Path
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+
+
+def startup_modules(app: Path = APP) -> list[str]:
+    """Read the modules imported at the top level of app.py.
+
+    The standard library is left out, its import time is not ours to tune.
+
+    Args:
+    ----
+        app (Path): Path to app.py.
+
+    Returns:
+    -------
+        list[str]: Names of the imported modules, in order of import.
+
+    """
+    modules: list[str] = []
+    for node in ast.parse(app.read_text(encoding="utf-8")).body:
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        modules.extend(
+            name
+            for name in names
+            if name.split(".")[0] not in sys.stdlib_module_names
+            and name not in modules
+        )
+    return modules
+
+
+def import_times(modules: list[str]) -> list[tuple[int, int, str]]:
+    """Import modules in a fresh interpreter and collect their import times.
+
+    Args:
+    ----
+        modules (list[str]): Modules to import.
+
+    Returns:
+    -------
+        list[tuple[int, int, str]]: Self and cumulative time in microseconds
+            and name of every imported module.
+
+    """
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times.append((int(self_us), int(cumulative_us), name.strip()))
+    return times
+
+
+def main() -> None:
+    """Print the slowest imports and the total import time."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=startup_modules())
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    times = import_times(args.modules)
+    total = sum(self_us for self_us, _, _ in times)
+
+    print(f"{'cumulative, ms':>15} {'self, ms':>10}  module")  # noqa: T201
+    for self_us, cumulative_us, name in sorted(times, key=lambda t: -t[1])[: args.top]:
+        print(f"{cumulative_us / 1000:>15.1f} {self_us / 1000:>10.1f}  {name}")  # noqa: T201
+    print(f"\nTotal: {total / 1000:.1f} ms in {len(times)} modules")  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
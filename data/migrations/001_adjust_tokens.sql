@@ -0,0 +1,24 @@
+-- Atomic change of a user's token balance.
+--
+-- Adds `delta` to the balance in a single statement, so concurrent debits
+-- and credits cannot overwrite each other. The balance never goes below
+-- zero: if it would, nothing is changed and NULL is returned, as it is for
+-- an unknown user. Otherwise the new balance is returned.
+create or replace function public.adjust_tokens(
+    p_user_id public.users.user_id%type,
+    p_delta integer
+)
+returns integer
+language sql
+as $$
+    update public.users
+    set tokens = tokens + p_delta
+    where user_id = p_user_id and tokens + p_delta >= 0
+    returning tokens;
+$$;
+
+-- Functions in `public` are executable by everyone by default, and the
+-- anon key could credit itself tokens through /rpc/adjust_tokens.
+-- Only the bot, connecting with the service role key, may call it.
+revoke execute on function public.adjust_tokens from public, anon, authenticated;
+grant execute on function public.adjust_tokens to service_role;
@@ -0,0 +1,154 @@
+"""Registrations module."""
+
+from __future__ import annotations
+
+import threading
+from datetime import UTC, datetime
+from typing import TYPE_CHECKING, Any, Callable
+
+from data.storage import DEFAULT_TOKENS
+from modules.user import User
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+    from data.storage import UserStorage
+
+
+class RegistrationBuffer:
+    """Write-behind buffer of new users.
+
+    Registrations are answered at once with a provisional user and written
+    later with one bulk upsert, when `batch_size` users are pending or
+    `flush_interval` seconds have passed. Failed batches stay pending and
+    are retried on the next flush.
+
+    Attributes
+    ----------
+        storage (UserStorage): The backend that keeps the users table.
+        batch_size (int): Number of pending users that triggers a flush.
+        flush_interval (float): Maximum delay of a registration in seconds.
+        on_flush (Callable[[list[int], list[dict[str, Any]]], None] | None):
+            Called after every flush with the IDs of the written users and
+            the rows that were actually inserted.
+
+    """
+
+    def __init__(
+        self: RegistrationBuffer,
+        storage: UserStorage,
+        logger: Logger,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        on_flush: Callable[[list[int], list[dict[str, Any]]], None] | None = None,
+    ) -> None:
+        """Create a new buffer and start its flush thread.
+
+        Args:
+        ----
+            storage (UserStorage): The backend that keeps the users table.
+            logger (CustomLogger): Logger instance for logging.
+            batch_size (int): Number of pending users that triggers a flush.
+            flush_interval (float): Maximum delay of a registration in seconds.
+            on_flush (Callable[[list[int], list[dict[str, Any]]], None] | None):
+                Called after every flush with the IDs of the written users
+                and the rows that were actually inserted.
+
+        """
+        self.storage = storage
+        self.logger = logger
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.__pending: dict[int, User] = {}
+        self.__lock = threading.Lock()
+        # Serializes flushes, so a user is never written by two at once
+        self.__flush_lock = threading.Lock()
+        self.__wake = threading.Event()
+        threading.Thread(target=self.__run, name="registrations", daemon=True).start()
+
+    def add(self: RegistrationBuffer, user_id: int, name: str) -> User:
+        """Queue a registration.
+
+        Args:
+        ----
+            user_id (int): The ID of the user.
+            name (str): The name of the user.
+
+        Returns:
+        -------
+            User: Provisional user with the default balance.
+
+        """
+        user = User(
+            user_id,
+            name,
+            DEFAULT_TOKENS,
+            datetime.now(UTC).isoformat(),
+        )
+        with self.__lock:
+            self.__pending.setdefault(user_id, user)
+            if len(self.__pending) >= self.batch_size:
+                self.__wake.set()
+            return self.__pending[user_id]
+
+    def pending(self: RegistrationBuffer, user_id: int) -> User | None:
+        """Return the provisional user if the registration is not written yet.
+
+        Args:
+        ----
+            user_id (int): The ID of the user.
+
+        Returns:
+        -------
+            User | None: The provisional user, or None if not pending.
+
+        """
+        with self.__lock:
+            return self.__pending.get(user_id)
+
+    def flush(self: RegistrationBuffer) -> bool:
+        """Write all pending registrations.
+
+        Returns
+        -------
+            bool: True if nothing is left pending.
+
+        """
+        with self.__flush_lock:
+            with self.__lock:
+                batch = dict(self.__pending)
+            if not batch:
+                return True
+
+            try:
+                rows = self.storage.upsert_users(
+                    [(user_id, user.name) for user_id, user in batch.items()],
+                )
+            except Exception:
+                self.logger.exception(
+                    "Error in registration of %s users",
+                    len(batch),
+                    extra={"message_type": "user"},
+                )
+                return False
+
+            with self.__lock:
+                for user_id in batch:
+                    self.__pending.pop(user_id, None)
+
+        if self.on_flush is not None:
+            self.on_flush(list(batch), rows)
+        self.logger.info(
+            "Registered %s users.",
+            len(batch),
+            extra={"message_type": "server"},
+        )
+        return True
+
+    def __run(self: RegistrationBuffer) -> None:
+        """Flush on size or on time."""
+        while True:
+            self.__wake.wait(self.flush_interval)
+            self.__wake.clear()
+            self.flush()
@@ -0,0 +1,296 @@
+"""Storage module.
+
+Backends that keep the `users` table for `UserDatabase`.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from supabase import Client  # type: ignore[import-untyped]
+
+# Tokens given to a new user, same as the column default in Supabase
+DEFAULT_TOKENS = 5
+
+# Schema of the users table, mirrors the Supabase table
+SQLITE_SCHEMA = f"""
+create table if not exists users (
+    user_id integer primary key,
+    name text not null,
+    tokens integer not null default {DEFAULT_TOKENS} check (tokens >= 0),
+    created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+)
+"""
+
+
+class UserStorage(ABC):
+    """Storage of the users table.
+
+    Methods raise on storage errors, `UserDatabase` turns them into
+    status codes. Rows are dictionaries with the `User` fields.
+    """
+
+    def connect(self: UserStorage) -> None:  # noqa: B027
+        """Open the connection ahead of the first query."""
+
+    @abstractmethod
+    def insert_user(
+        self: UserStorage,
+        user_id: int,
+        name: str,
+    ) -> dict[str, Any] | None:
+        """Insert a user.
+
+        Args:
+        ----
+            user_id (int): The ID of the user.
+            name (str): The name of the user.
+
+        Returns:
+        -------
+            dict[str, Any] | None: The inserted row, if returned by the storage.
+
+        """
+
+    @abstractmethod
+    def upsert_users(
+        self: UserStorage,
+        users: list[tuple[int, str]],
+    ) -> list[dict[str, Any]]:
+        """Insert users in one statement, skipping those that already exist.
+
+        Existing rows are left as they are, so a repeated registration never
+        resets the balance.
+
+        Args:
+        ----
+            users (list[tuple[int, str]]): IDs and names of the users.
+
+        Returns:
+        -------
+            list[dict[str, Any]]: The inserted rows.
+
+        """
+
+    @abstractmethod
+    def select_user(self: UserStorage, user_id: int) -> dict[str, Any] | None:
+        """Select a user.
+
+        Args:
+        ----
+            user_id (int): The ID of the user.
+
+        Returns:
+        -------
+            dict[str, Any] | None: The row, or None if the user is not found.
+
+        """
+
+    @abstractmethod
+    def adjust_tokens(self: UserStorage, user_id: int, delta: int) -> int | None:
+        """Add to the balance of a user in a single atomic statement.
+
+        Args:
+        ----
+            user_id (int): The ID of the user.
+            delta (int): The amount of tokens to add, negative to subtract.
+
+        Returns:
+        -------
+            int | None: The new balance, or None if the user is not found
+                or the balance would become negative.
+
+        """
+
+
+class SupabaseStorage(UserStorage):
+    """Users table in Supabase.
+
+    Attributes
+    ----------
+        supabase_url (str): The URL of the Supabase database.
+        supabase_key (str): The API key of the Supabase database.
+
+    """
+
+    def __init__(self: SupabaseStorage, supabase_url: str, supabase_key: str) -> None:
+        """Create a new storage, the client is created on first use.
+
+        Args:
+        ----
+            supabase_url (str): The URL of the Supabase database.
+            supabase_key (str): The API key of the Supabase database.
+
+        """
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.__client: Client | None = None  # type: ignore[no-any-unimported]
+        self.__lock = threading.Lock()
+
+    @property
+    def client(self: SupabaseStorage) -> Client:  # type: ignore[no-any-unimported]
+        """Return the Supabase client, creating it on first use.
+
+        The supabase package is slow to import, so it is imported here
+        instead of at startup.
+
+        Returns
+        -------
+            supabase.Client: The Supabase client for the database.
+
+        """
+        with self.__lock:
+            if self.__client is None:
+                from supabase import create_client  # type: ignore[import-untyped]
+
+                self.__client = create_client(self.supabase_url, self.supabase_key)
+            return self.__client
+
+    def connect(self: SupabaseStorage) -> None:
+        """Create the client ahead of the first query."""
+        self.client  # noqa: B018
+
+    def insert_user(
+        self: SupabaseStorage,
+        user_id: int,
+        name: str,
+    ) -> dict[str, Any] | None:
+        """Insert a user."""
+        data = (
+            self.client.table("users")
+            .insert({"user_id": str(user_id), "name": name})
+            .execute()
+            .data
+        )
+        return data[0] if data else None
+
+    def upsert_users(
+        self: SupabaseStorage,
+        users: list[tuple[int, str]],
+    ) -> list[dict[str, Any]]:
+        """Insert users in one statement, skipping those that already exist."""
+        return (  # type: ignore[no-any-return]
+            self.client.table("users")
+            .upsert(
+                [{"user_id": str(user_id), "name": name} for user_id, name in users],
+                on_conflict="user_id",
+                ignore_duplicates=True,
+            )
+            .execute()
+            .data
+        )
+
+    def select_user(self: SupabaseStorage, user_id: int) -> dict[str, Any] | None:
+        """Select a user."""
+        data = (
+            self.client.table("users")
+            .select("*")
+            .eq("user_id", str(user_id))
+            .execute()
+            .data
+        )
+        return data[0] if data else None
+
+    def adjust_tokens(self: SupabaseStorage, user_id: int, delta: int) -> int | None:
+        """Call the `adjust_tokens` database function.
+
+        See data/migrations/001_adjust_tokens.sql.
+        """
+        return (  # type: ignore[no-any-return]
+            self.client.rpc(
+                "adjust_tokens",
+                {"p_user_id": str(user_id), "p_delta": delta},
+            )
+            .execute()
+            .data
+        )
+
+
+class SQLiteStorage(UserStorage):
+    """Users table in an embedded SQLite database.
+
+    Used for offline benchmarks and small deployments. One connection is
+    shared by all threads and serialized with a lock.
+
+    Attributes
+    ----------
+        path (Path): Path to the database file.
+
+    """
+
+    def __init__(self: SQLiteStorage, path: str) -> None:
+        """Open the database and create the users table if needed.
+
+        Args:
+        ----
+            path (str): Path to the database file, ":memory:" for a
+                database that lives in memory.
+
+        """
+        self.path = Path(path)
+        if path != ":memory:":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.__connection = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.__connection.row_factory = sqlite3.Row
+        self.__lock = threading.Lock()
+        with self.__lock:
+            self.__connection.execute("pragma journal_mode = wal")
+            self.__connection.execute(SQLITE_SCHEMA)
+
+    def insert_user(
+        self: SQLiteStorage,
+        user_id: int,
+        name: str,
+    ) -> dict[str, Any] | None:
+        """Insert a user."""
+        with self.__lock:
+            row = self.__connection.execute(
+                "insert into users (user_id, name) values (?, ?) returning *",
+                (user_id, name),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def upsert_users(
+        self: SQLiteStorage,
+        users: list[tuple[int, str]],
+    ) -> list[dict[str, Any]]:
+        """Insert users in one statement, skipping those that already exist."""
+        if not users:
+            return []
+
+        values = ", ".join(["(?, ?)"] * len(users))
+        with self.__lock:
+            rows = self.__connection.execute(
+                f"insert into users (user_id, name) values {values} "  # noqa: S608
+                "on conflict (user_id) do nothing returning *",
+                [field for user in users for field in user],
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def select_user(self: SQLiteStorage, user_id: int) -> dict[str, Any] | None:
+        """Select a user."""
+        with self.__lock:
+            row = self.__connection.execute(
+                "select * from users where user_id = ?",
+                (user_id,),
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def adjust_tokens(self: SQLiteStorage, user_id: int, delta: int) -> int | None:
+        """Add to the balance with a guarded single-statement update."""
+        with self.__lock:
+            row = self.__connection.execute(
+                "update users set tokens = tokens + ? "
+                "where user_id = ? and tokens + ? >= 0 returning tokens",
+                (delta, user_id, delta),
+            ).fetchone()
+        return row["tokens"] if row is not None else None
@@ -2,43 +2,68 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
-
-from supabase import Client, create_client  # type: ignore[import-untyped]
+from typing import TYPE_CHECKING, Any
 
+from data.registrations import RegistrationBuffer
 from modules.user import User
 
 if TYPE_CHECKING:
     from logging import Logger
 
+    from data.storage import UserStorage
+    from modules.cache import LRUCache
+
 
 class UserDatabase:
     """Class for interacting with the user database.
 
     Attributes
     ----------
-        client (supabase.Client): The Supabase client for the database.
+        storage (UserStorage): The backend that keeps the users table.
         logger (modules.logger.CustomLogger): The logger for the bot.
+        cache (LRUCache | None): Cache of the users by ID.
+        registrations (RegistrationBuffer | None): Write-behind buffer of
+            new users, None if users are inserted at once.
 
     """
 
     def __init__(
         self: UserDatabase,
-        supabase_url: str,
-        supabase_key: str,
+        storage: UserStorage,
         logger: Logger,
+        cache: LRUCache | None = None,
+        registration_batch: int = 1,
+        registration_interval: float = 1.0,
     ) -> None:
         """Create a new UserDatabase instance.
 
         Args:
         ----
-            supabase_url (str): The URL of the Supabase database.
-            supabase_key (str): The API key of the Supabase database.
+            storage (UserStorage): The backend that keeps the users table,
+                Supabase or SQLite.
             logger (modules.logger.CustomLogger): The logger for the bot.
+            cache (LRUCache | None): Cache of the users by ID. Writes
+                through this instance keep it up to date.
+            registration_batch (int): Number of new users written in one
+                bulk upsert, 1 to insert every user at once.
+            registration_interval (float): Maximum delay of a new user's
+                insert in seconds.
 
         """
-        self.client: Client = create_client(supabase_url, supabase_key)  # type: ignore[no-any-unimported]
+        self.storage = storage
         self.logger = logger
+        self.cache = cache
+        self.registrations = (
+            RegistrationBuffer(
+                storage,
+                logger,
+                batch_size=registration_batch,
+                flush_interval=registration_interval,
+                on_flush=self.__registered,
+            )
+            if registration_batch > 1
+            else None
+        )
 
     def new_user(self: UserDatabase, user_id: int, username: str | None) -> None:
         """Insert a new user into the database.
@@ -49,15 +74,22 @@ class UserDatabase:
             username (str): The name of the user.
 
         """
+        name = username if username is not None else "unknown user"
+        if self.registrations is not None:
+            self.__remember(self.registrations.add(user_id, name))
+            return
+
         try:
-            self.client.table("users").insert(
-                {
-                    "user_id": str(user_id),
-                    "name": username if username is not None else "unknown user",
-                },
-            ).execute()
+            user_data = self.storage.insert_user(user_id, name)
         except Exception as e:
             self.logger.exception(str(e), "user")  # noqa: TRY401
+            self.__invalidate(user_id)
+            return
+
+        if user_data is not None:
+            self.__remember(User(**user_data))
+        else:
+            self.__invalidate(user_id)
 
     def get_user(self: UserDatabase, user_id: int) -> [int, User | None]:
         """Get a user from the database.
@@ -71,22 +103,32 @@ class UserDatabase:
             (int, Optional[User]): The status code and the user if found, else None.
 
         """
+        if self.cache is not None:
+            cached = self.cache.get(user_id)
+            if cached is not None:
+                return 200, cached
+
+        if self.registrations is not None:
+            pending = self.registrations.pending(user_id)
+            if pending is not None:
+                return 200, pending
+
         try:
-            user_data = (
-                self.client.table("users")
-                .select("*")
-                .eq("user_id", str(user_id))
-                .execute()
-                .data
-            )
-            user = User(**user_data[0]) if user_data else None
+            user_data = self.storage.select_user(user_id)
+            user = User(**user_data) if user_data is not None else None
         except Exception:
             self.logger.exception("Error in get_user", extra={"message_type": "user"})
             return 400, None
-        else:
-            return 200, user
 
-    def increase_tokens(self: UserDatabase, user_id: int, tokens: int) -> int:
+        if user is not None:
+            self.__remember(user)
+        return 200, user
+
+    def increase_tokens(
+        self: UserDatabase,
+        user_id: int,
+        tokens: int,
+    ) -> tuple[int, int | None]:
         """Increase the tokens of a user.
 
         Args:
@@ -96,32 +138,20 @@ class UserDatabase:
 
         Returns:
         -------
-            int: The status code.
+            (int, Optional[int]): The status code and the new balance.
 
         """
-        try:
-            current_tokens = (
-                self.client.table("users")
-                .select("tokens")
-                .eq("user_id", str(user_id))
-                .execute()
-            ).data[0]["tokens"]
-            self.client.table("users").update({"tokens": current_tokens + tokens}).eq(
-                "user_id",
-                str(user_id),
-            ).execute()
-        except Exception:
-            self.logger.exception(
-                "Error in increase_tokens",
-                extra={"message_type": "user"},
-            )
-            return 400
-        else:
-            return 200
+        return self.__adjust_tokens(user_id, tokens)
 
-    def decrease_tokens(self: UserDatabase, user_id: int, tokens: int) -> int:
+    def decrease_tokens(
+        self: UserDatabase,
+        user_id: int,
+        tokens: int,
+    ) -> tuple[int, int | None]:
         """Decrease the tokens of a user.
 
+        The balance is never made negative.
+
         Args:
         ----
             user_id (int): The ID of the user.
@@ -129,25 +159,77 @@ class UserDatabase:
 
         Returns:
         -------
-            int: The status code.
+            (int, Optional[int]): The status code and the new balance.
 
         """
+        return self.__adjust_tokens(user_id, -tokens)
+
+    def __adjust_tokens(
+        self: UserDatabase,
+        user_id: int,
+        delta: int,
+    ) -> tuple[int, int | None]:
+        """Change the balance of a user in a single atomic statement.
+
+        The balance is never made negative.
+
+        Args:
+        ----
+            user_id (int): The ID of the user.
+            delta (int): The amount of tokens to add, negative to subtract.
+
+        Returns:
+        -------
+            (int, Optional[int]): The status code and the new balance.
+                Return 403 if the user is not found or the balance
+                would become negative.
+
+        """
+        # The user must be written before the balance can change
+        if (
+            self.registrations is not None
+            and self.registrations.pending(user_id) is not None
+            and not self.registrations.flush()
+        ):
+            return 400, None
+
         try:
-            current_tokens = (
-                self.client.table("users")
-                .select("tokens")
-                .eq("user_id", str(user_id))
-                .execute()
-            ).data[0]["tokens"]
-            self.client.table("users").update({"tokens": current_tokens - tokens}).eq(
-                "user_id",
-                str(user_id),
-            ).execute()
+            balance = self.storage.adjust_tokens(user_id, delta)
         except Exception:
             self.logger.exception(
-                "Error in decrease_tokens",
+                "Error in adjust_tokens",
                 extra={"message_type": "user"},
             )
-            return 400
-        else:
-            return 200
+            self.__invalidate(user_id)
+            return 400, None
+
+        if balance is None:
+            self.__invalidate(user_id)
+            return 403, None
+
+        if self.cache is not None:
+            cached = self.cache.get(user_id)
+            if cached is not None:
+                self.cache.put(user_id, cached.with_tokens(balance))
+        return 200, balance
+
+    def __registered(
+        self: UserDatabase,
+        user_ids: list[int],
+        rows: list[dict[str, Any]],
+    ) -> None:
+        """Replace provisional users in the cache with the written rows."""
+        for user_id in user_ids:
+            self.__invalidate(user_id)
+        for row in rows:
+            self.__remember(User(**row))
+
+    def __remember(self: UserDatabase, user: User) -> None:
+        """Put a user into the cache."""
+        if self.cache is not None:
+            self.cache.put(int(user.id), user)
+
+    def __invalidate(self: UserDatabase, user_id: int) -> None:
+        """Remove a user from the cache."""
+        if self.cache is not None:
+            self.cache.invalidate(user_id)
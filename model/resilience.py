@@ -0,0 +1,489 @@
+"""Resilience module.
+
+Retries, hedged requests and circuit breaking for the model calls.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+import requests  # type: ignore[import-untyped]
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+    from model.timeouts import TimeoutPolicy
+
+# Status codes worth another attempt: timeouts, throttling and upstream errors
+RETRYABLE_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+# Status code returned without calling the upstream while the circuit is open
+CIRCUIT_OPEN_CODE = 503
+
+# Status codes reported for transport failures raised by requests or httpx
+TIMEOUT_CODE = 504
+CONNECTION_ERROR_CODE = 503
+
+
+class CircuitBreaker:
+    """Circuit breaker that fails fast while the upstream is down.
+
+    The breaker opens after `failure_threshold` consecutive failures.
+    While open, calls are rejected until `reset_timeout` seconds pass,
+    then a single trial call is let through (half-open state).
+    A successful trial closes the breaker, a failed one opens it again.
+
+    Attributes
+    ----------
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_timeout (float): Seconds to stay open before a trial call.
+
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(
+        self: CircuitBreaker,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        """Create a new circuit breaker.
+
+        Args:
+        ----
+            failure_threshold (int): Consecutive failures that open the breaker.
+            reset_timeout (float): Seconds to stay open before a trial call.
+
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__state = self.CLOSED
+        self.__failures = 0
+        self.__opened_at = 0.0
+        self.__trial_running = False
+        self.__lock = threading.Lock()
+
+    @property
+    def state(self: CircuitBreaker) -> str:
+        """Return the current state of the breaker.
+
+        Returns
+        -------
+            str: One of "closed", "open" and "half-open".
+
+        """
+        with self.__lock:
+            if (
+                self.__state == self.OPEN
+                and time.monotonic() - self.__opened_at >= self.reset_timeout
+            ):
+                return self.HALF_OPEN
+            return self.__state
+
+    def allow(self: CircuitBreaker) -> bool:
+        """Check if a call may be sent to the upstream.
+
+        Returns
+        -------
+            bool: True if the call is allowed.
+
+        """
+        with self.__lock:
+            if self.__state == self.CLOSED:
+                return True
+
+            if time.monotonic() - self.__opened_at < self.reset_timeout:
+                return False
+
+            # Half-open: let exactly one trial call through
+            if self.__trial_running:
+                return False
+            self.__state = self.HALF_OPEN
+            self.__trial_running = True
+            return True
+
+    def record_success(self: CircuitBreaker) -> None:
+        """Record a successful call and close the breaker."""
+        with self.__lock:
+            self.__state = self.CLOSED
+            self.__failures = 0
+            self.__trial_running = False
+
+    def record_failure(self: CircuitBreaker) -> None:
+        """Record a failed call and open the breaker if needed."""
+        with self.__lock:
+            self.__failures += 1
+            self.__trial_running = False
+            if (
+                self.__state == self.HALF_OPEN
+                or self.__failures >= self.failure_threshold
+            ):
+                self.__state = self.OPEN
+                self.__opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """Wrapper that makes model calls survive transient failures.
+
+    The wrapped functions follow the `model/` convention and return
+    a `(status_code, text)` tuple. Failed calls with a retryable status code
+    (or a transport error) are retried with jittered exponential backoff.
+    When `hedge_after` is set, a second identical request is sent if the
+    first one has not answered in time, and the first successful answer wins.
+    When a `timeout_policy` is set and the payload size is known,
+    each attempt gets a size-derived timeout and successful latencies
+    are fed back to the policy.
+    `acall` does the same for coroutine functions inside an event loop.
+
+    Attributes
+    ----------
+        name (str): Name of the upstream, used in logs.
+        retries (int): Additional attempts after the first one.
+        base_delay (float): Base backoff delay in seconds.
+        max_delay (float): Upper bound of the backoff delay in seconds.
+        hedge_after (float | None): Seconds before a hedged request is sent.
+        breaker (CircuitBreaker): Circuit breaker of the upstream.
+        timeout_policy (TimeoutPolicy | None): Timeout policy of the upstream.
+
+    """
+
+    def __init__(  # noqa: PLR0913
+        self: ResilientCaller,
+        name: str,
+        logger: Logger,
+        retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        hedge_after: float | None = None,
+        breaker: CircuitBreaker | None = None,
+        timeout_policy: TimeoutPolicy | None = None,
+    ) -> None:
+        """Create a new resilient caller.
+
+        Args:
+        ----
+            name (str): Name of the upstream, used in logs.
+            logger (CustomLogger): Logger instance for logging.
+            retries (int): Additional attempts after the first one.
+            base_delay (float): Base backoff delay in seconds.
+            max_delay (float): Upper bound of the backoff delay in seconds.
+            hedge_after (float | None): Seconds before a hedged request is sent.
+                None disables hedging.
+            breaker (CircuitBreaker | None): Circuit breaker of the upstream.
+            timeout_policy (TimeoutPolicy | None): Timeout policy of the upstream.
+
+        """
+        self.name = name
+        self.logger = logger
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.timeout_policy = timeout_policy
+        self.__executor: ThreadPoolExecutor | None = None
+
+    def call(
+        self: ResilientCaller,
+        func: Callable[..., tuple[int, Any]],
+        *args: Any,  # noqa: ANN401
+        payload_size: int | None = None,
+        hedge: bool = True,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> tuple[int, Any]:
+        """Call a model function with retries, hedging and circuit breaking.
+
+        Args:
+        ----
+            func (Callable): Model function returning (status code, result).
+            *args: Positional arguments of the function.
+            payload_size (int | None): Payload size used to derive the timeout.
+                The function must accept a `timeout` keyword argument.
+            hedge (bool): Whether the call may be hedged. False for calls with
+                side effects, such as streaming into a callback.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+        -------
+            tuple[int, Any]: Status code and result of the last attempt.
+
+        """
+        code, result = CIRCUIT_OPEN_CODE, ""
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.logger.info(
+                    "Circuit open for %s, failing fast.",
+                    self.name,
+                    extra={"message_type": "model"},
+                )
+                return CIRCUIT_OPEN_CODE, ""
+
+            sized = self.timeout_policy is not None and payload_size is not None
+            if sized:
+                kwargs["timeout"] = self.timeout_policy.timeout(payload_size)  # type: ignore[union-attr, arg-type]
+
+            started = time.monotonic()
+            if self.hedge_after is None or not hedge:
+                code, result = self.attempt(func, *args, **kwargs)
+            else:
+                code, result = self.__hedged(func, args, kwargs)
+
+            if sized and code == 200:  # noqa: PLR2004
+                self.timeout_policy.observe(  # type: ignore[union-attr]
+                    payload_size,  # type: ignore[arg-type]
+                    time.monotonic() - started,
+                )
+
+            if code not in RETRYABLE_CODES:
+                # Success or a client error: retrying will not help
+                self.breaker.record_success()
+                return code, result
+
+            self.breaker.record_failure()
+            if attempt < self.retries:
+                delay = self.backoff(attempt)
+                self.logger.info(
+                    "%s failed with %s, retry in %.1fs.",
+                    self.name,
+                    code,
+                    delay,
+                    extra={"message_type": "model"},
+                )
+                time.sleep(delay)
+
+        return code, result
+
+    async def acall(
+        self: ResilientCaller,
+        func: Callable[..., Awaitable[tuple[int, Any]]],
+        *args: Any,  # noqa: ANN401
+        payload_size: int | None = None,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> tuple[int, Any]:
+        """Await a model coroutine with retries, hedging and circuit breaking.
+
+        Args:
+        ----
+            func (Callable): Model coroutine function returning (status code, result).
+            *args: Positional arguments of the function.
+            payload_size (int | None): Payload size used to derive the timeout.
+                The function must accept a `timeout` keyword argument.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+        -------
+            tuple[int, Any]: Status code and result of the last attempt.
+
+        """
+        code, result = CIRCUIT_OPEN_CODE, ""
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow():
+                self.logger.info(
+                    "Circuit open for %s, failing fast.",
+                    self.name,
+                    extra={"message_type": "model"},
+                )
+                return CIRCUIT_OPEN_CODE, ""
+
+            sized = self.timeout_policy is not None and payload_size is not None
+            if sized:
+                kwargs["timeout"] = self.timeout_policy.timeout(payload_size)  # type: ignore[union-attr, arg-type]
+
+            started = time.monotonic()
+            if self.hedge_after is None:
+                code, result = await self.aattempt(func, *args, **kwargs)
+            else:
+                code, result = await self.__ahedged(func, args, kwargs)
+
+            if sized and code == 200:  # noqa: PLR2004
+                self.timeout_policy.observe(  # type: ignore[union-attr]
+                    payload_size,  # type: ignore[arg-type]
+                    time.monotonic() - started,
+                )
+
+            if code not in RETRYABLE_CODES:
+                self.breaker.record_success()
+                return code, result
+
+            self.breaker.record_failure()
+            if attempt < self.retries:
+                delay = self.backoff(attempt)
+                self.logger.info(
+                    "%s failed with %s, retry in %.1fs.",
+                    self.name,
+                    code,
+                    delay,
+                    extra={"message_type": "model"},
+                )
+                await asyncio.sleep(delay)
+
+        return code, result
+
+    def backoff(self: ResilientCaller, attempt: int) -> float:
+        """Return a full-jitter exponential backoff delay.
+
+        Args:
+        ----
+            attempt (int): Zero-based number of the failed attempt.
+
+        Returns:
+        -------
+            float: Delay in seconds.
+
+        """
+        return random.uniform(  # noqa: S311
+            0,
+            min(self.max_delay, self.base_delay * 2**attempt),
+        )
+
+    def attempt(
+        self: ResilientCaller,
+        func: Callable[..., tuple[int, Any]],
+        *args: Any,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> tuple[int, Any]:
+        """Make a single attempt, mapping transport errors to status codes.
+
+        Args:
+        ----
+            func (Callable): Model function returning (status code, result).
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+        -------
+            tuple[int, Any]: Status code and result.
+
+        """
+        try:
+            return func(*args, **kwargs)
+        except requests.Timeout:
+            self.logger.info(
+                "%s timed out.",
+                self.name,
+                extra={"message_type": "model"},
+            )
+            return TIMEOUT_CODE, ""
+        except requests.RequestException as e:
+            self.logger.info(
+                "%s request error: %s",
+                self.name,
+                e,
+                extra={"message_type": "model"},
+            )
+            return CONNECTION_ERROR_CODE, ""
+
+    async def aattempt(
+        self: ResilientCaller,
+        func: Callable[..., Awaitable[tuple[int, Any]]],
+        *args: Any,  # noqa: ANN401
+        **kwargs: Any,  # noqa: ANN401
+    ) -> tuple[int, Any]:
+        """Make a single awaited attempt, mapping transport errors to status codes.
+
+        Args:
+        ----
+            func (Callable): Model coroutine function returning (status code, result).
+            *args: Positional arguments of the function.
+            **kwargs: Keyword arguments of the function.
+
+        Returns:
+        -------
+            tuple[int, Any]: Status code and result.
+
+        """
+        import httpx
+
+        try:
+            return await func(*args, **kwargs)
+        except httpx.TimeoutException:
+            self.logger.info(
+                "%s timed out.",
+                self.name,
+                extra={"message_type": "model"},
+            )
+            return TIMEOUT_CODE, ""
+        except httpx.HTTPError as e:
+            self.logger.info(
+                "%s request error: %s",
+                self.name,
+                e,
+                extra={"message_type": "model"},
+            )
+            return CONNECTION_ERROR_CODE, ""
+
+    async def __ahedged(
+        self: ResilientCaller,
+        func: Callable[..., Awaitable[tuple[int, Any]]],
+        args: tuple,
+        kwargs: dict,
+    ) -> tuple[int, Any]:
+        """Await a request and a hedged copy if the first one is slow."""
+        pending = {asyncio.ensure_future(self.aattempt(func, *args, **kwargs))}
+        done, pending = await asyncio.wait(pending, timeout=self.hedge_after)
+        if not done:
+            self.logger.info(
+                "%s is slow, sending hedged request.",
+                self.name,
+                extra={"message_type": "model"},
+            )
+            pending.add(asyncio.ensure_future(self.aattempt(func, *args, **kwargs)))
+
+        code, result = CIRCUIT_OPEN_CODE, ""
+        try:
+            while True:
+                for task in done:
+                    code, result = task.result()
+                    if code not in RETRYABLE_CODES:
+                        return code, result
+                if not pending:
+                    return code, result
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+        finally:
+            # The losing request is not needed any more
+            for task in pending:
+                task.cancel()
+
+    def __hedged(
+        self: ResilientCaller,
+        func: Callable[..., tuple[int, Any]],
+        args: tuple,
+        kwargs: dict,
+    ) -> tuple[int, Any]:
+        """Send a request and a hedged copy if the first one is slow."""
+        if self.__executor is None:
+            self.__executor = ThreadPoolExecutor(
+                thread_name_prefix=f"hedge-{self.name}",
+            )
+
+        pending: set[Future] = {
+            self.__executor.submit(self.attempt, func, *args, **kwargs),
+        }
+        done, pending = wait(pending, timeout=self.hedge_after)
+        if not done:
+            self.logger.info(
+                "%s is slow, sending hedged request.",
+                self.name,
+                extra={"message_type": "model"},
+            )
+            pending.add(self.__executor.submit(self.attempt, func, *args, **kwargs))
+
+        code, result = CIRCUIT_OPEN_CODE, ""
+        while True:
+            for future in done:
+                code, result = future.result()
+                if code not in RETRYABLE_CODES:
+                    return code, result
+            if not pending:
+                return code, result
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
@@ -7,14 +7,21 @@ from typing import TYPE_CHECKING
 
 import requests  # type: ignore[import-untyped]
 
+from model.timeouts import httpx_timeout
+
 if TYPE_CHECKING:
     from logging import Logger
 
+    import httpx
+
+BASE_URL = "https://smartspeech.sber.ru/rest/v1/speech:recognize"
+
 
 def speech2text(
     oauth_token: str,
     audio_file_path: str,
     logger: Logger,
+    timeout: float | tuple[float, float] = 10,
 ) -> tuple[int, str]:
     """Speech to text.
 
@@ -26,13 +33,14 @@ def speech2text(
         path to audio file
     logger: CustomLogger
         logger
+    timeout: float | tuple[float, float]
+        request timeout, or (connect, read) timeouts, in seconds
 
     Returns
     -------
     tuple[int, str]: status code and text
 
     """
-    base_url = "https://smartspeech.sber.ru/rest/v1/speech:recognize"
     headers = {
         "Authorization": f"Bearer {oauth_token}",
         "Content-Type": "audio/mpeg",
@@ -42,11 +50,11 @@ def speech2text(
         data = audio_file.read()
 
     response = requests.post(
-        base_url,
+        BASE_URL,
         headers=headers,
         data=data,
         verify=False,  # noqa: S501
-        timeout=10,
+        timeout=timeout,
     )
 
     if not response.ok:
@@ -55,3 +63,50 @@ def speech2text(
 
     logger.info("Speech to text successful.", extra={"message_type": "openai"})
     return 200, " ".join(response.json()["result"]) + "\n"
+
+
+async def speech2text_async(
+    client: httpx.AsyncClient,
+    oauth_token: str,
+    audio_data: bytes,
+    logger: Logger,
+    timeout: float | tuple[float, float] = 10,  # noqa: ASYNC109
+) -> tuple[int, str]:
+    """Speech to text, as a coroutine.
+
+    Params.
+    ------
+    client: httpx.AsyncClient
+        HTTP client of the event loop
+    oauth_token: str
+        oauth token
+    audio_data: bytes
+        mp3 audio
+    logger: CustomLogger
+        logger
+    timeout: float | tuple[float, float]
+        request timeout, or (connect, read) timeouts, in seconds
+
+    Returns
+    -------
+    tuple[int, str]: status code and text
+
+    """
+    headers = {
+        "Authorization": f"Bearer {oauth_token}",
+        "Content-Type": "audio/mpeg",
+    }
+
+    response = await client.post(
+        BASE_URL,
+        headers=headers,
+        content=audio_data,
+        timeout=httpx_timeout(timeout),
+    )
+
+    if not response.is_success:
+        logger.error(response.text, "openai")
+        return response.status_code, ""
+
+    logger.info("Speech to text successful.", extra={"message_type": "openai"})
+    return 200, " ".join(response.json()["result"]) + "\n"
@@ -2,19 +2,28 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import json
+from typing import TYPE_CHECKING, Callable, Iterator
 
 import requests  # type: ignore[import-untyped]
 
+from model.timeouts import httpx_timeout
+
 if TYPE_CHECKING:
     from logging import Logger
 
+    import httpx
+
+BASE_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+MODEL = "GigaChat"
+
 
 def text2note(
     oauth_token: str,
     instruction: str,
     logger: Logger,
     text: str,
+    timeout: float | tuple[float, float] = 10,
 ) -> tuple[int, str]:
     """Text to note.
 
@@ -28,6 +37,8 @@ def text2note(
         instruction
     logger: CustomLogger
         logger
+    timeout: float | tuple[float, float]
+        request timeout, or (connect, read) timeouts, in seconds
 
     Returns
     -------
@@ -39,8 +50,6 @@ def text2note(
         {"role": "user", "content": text},
     ]
 
-    base_url = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
-
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json",
@@ -48,16 +57,16 @@ def text2note(
     }
 
     body = {
-        "model": "GigaChat",
+        "model": MODEL,
         "messages": messages,
     }
 
     response = requests.post(
-        base_url,
+        BASE_URL,
         headers=headers,
         json=body,
         verify=False,  # noqa: S501
-        timeout=10,
+        timeout=timeout,
     )
     if not response.ok:
         logger.error(str(response.json()), "openai")
@@ -65,3 +74,188 @@ def text2note(
 
     logger.info("Text to note successful.", extra={"message_type": "text2note"})
     return 200, response.json()["choices"][0]["message"]["content"]
+
+
+async def text2note_async(  # noqa: PLR0913
+    client: httpx.AsyncClient,
+    oauth_token: str,
+    instruction: str,
+    logger: Logger,
+    text: str,
+    timeout: float | tuple[float, float] = 10,  # noqa: ASYNC109
+) -> tuple[int, str]:
+    """Text to note, as a coroutine.
+
+    Params.
+    ------
+    client: httpx.AsyncClient
+        HTTP client of the event loop
+    oauth_token: str
+        oauth token
+    text: str
+        text
+    instruction: str
+        instruction
+    logger: CustomLogger
+        logger
+    timeout: float | tuple[float, float]
+        request timeout, or (connect, read) timeouts, in seconds
+
+    Returns
+    -------
+    tuple[int, str]: status code and text
+
+    """
+    messages = [
+        {"role": "system", "content": instruction},
+        {"role": "user", "content": text},
+    ]
+
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "application/json",
+        "Authorization": f"Bearer {oauth_token}",
+    }
+
+    body = {
+        "model": MODEL,
+        "messages": messages,
+    }
+
+    response = await client.post(
+        BASE_URL,
+        headers=headers,
+        json=body,
+        timeout=httpx_timeout(timeout),
+    )
+    if not response.is_success:
+        logger.error(response.text, "openai")
+        return response.status_code, ""
+
+    logger.info("Text to note successful.", extra={"message_type": "text2note"})
+    return 200, response.json()["choices"][0]["message"]["content"]
+
+
+def text2note_stream(
+    oauth_token: str,
+    instruction: str,
+    logger: Logger,
+    text: str,
+    timeout: float | tuple[float, float] = 10,
+) -> Iterator[str]:
+    """Text to note, streamed.
+
+    Sends the request with `stream: true` and parses the server-sent events.
+
+    Params.
+    ------
+    oauth_token: str
+        oauth token
+    text: str
+        text
+    instruction: str
+        instruction
+    logger: CustomLogger
+        logger
+    timeout: float | tuple[float, float]
+        request timeout, or (connect, read) timeouts, in seconds
+
+    Yields
+    ------
+    str: pieces of the answer as they arrive
+
+    Raises
+    ------
+    requests.HTTPError: if the API returns an error status
+
+    """
+    messages = [
+        {"role": "system", "content": instruction},
+        {"role": "user", "content": text},
+    ]
+
+    headers = {
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "Authorization": f"Bearer {oauth_token}",
+    }
+
+    body = {
+        "model": MODEL,
+        "messages": messages,
+        "stream": True,
+    }
+
+    with requests.post(
+        BASE_URL,
+        headers=headers,
+        json=body,
+        verify=False,  # noqa: S501
+        timeout=timeout,
+        stream=True,
+    ) as response:
+        if not response.ok:
+            logger.error(response.text, "openai")
+            response.raise_for_status()
+
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+
+            data = line.removeprefix("data:").strip()
+            if data == "[DONE]":
+                break
+
+            for choice in json.loads(data)["choices"]:
+                content = choice.get("delta", {}).get("content")
+                if content:
+                    yield content
+
+    logger.info("Text to note stream finished.", extra={"message_type": "text2note"})
+
+
+def text2note_streamed(  # noqa: PLR0913
+    oauth_token: str,
+    instruction: str,
+    logger: Logger,
+    text: str,
+    on_text: Callable[[str], None],
+    timeout: float | tuple[float, float] = 10,
+) -> tuple[int, str]:
+    """Text to note, reporting the growing answer while it streams.
+
+    Params.
+    ------
+    oauth_token: str
+        oauth token
+    text: str
+        text
+    instruction: str
+        instruction
+    logger: CustomLogger
+        logger
+    on_text: Callable[[str], None]
+        called with the answer received so far after every piece
+    timeout: float | tuple[float, float]
+        request timeout, or (connect, read) timeouts, in seconds
+
+    Returns
+    -------
+    tuple[int, str]: status code and text
+
+    """
+    result = ""
+    try:
+        for content in text2note_stream(
+            oauth_token,
+            instruction,
+            logger,
+            text,
+            timeout=timeout,
+        ):
+            result += content
+            on_text(result)
+    except requests.HTTPError as e:
+        return e.response.status_code, ""
+
+    return 200, result
@@ -0,0 +1,154 @@
+"""Timeouts module.
+
+Request timeouts derived from payload size and learned latencies.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import deque
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class TimeoutPolicy:
+    """Per-endpoint timeout policy.
+
+    The expected cost of a call is modelled as `overhead + per_unit * size`,
+    where size is the payload size in endpoint-specific units
+    (bytes of audio, characters of prompt). The read timeout is this cost
+    scaled by the learned percentile of observed latency/cost ratios and
+    a safety factor, clamped to [min_read, max_read].
+    The connect timeout is fixed and short, so dead hosts fail fast.
+
+    Attributes
+    ----------
+        connect (float): Connect timeout in seconds.
+        overhead (float): Fixed part of the expected cost in seconds.
+        per_unit (float): Seconds of expected cost per unit of payload.
+        slack (float): Safety factor applied to the learned latency.
+        percentile (float): Percentile of observed ratios, in (0, 1].
+        min_read (float): Lower bound of the read timeout in seconds.
+        max_read (float): Upper bound of the read timeout in seconds.
+        min_samples (int): Observations needed before the learned value is used.
+
+    """
+
+    def __init__(  # noqa: PLR0913
+        self: TimeoutPolicy,
+        overhead: float,
+        per_unit: float,
+        connect: float = 3.05,
+        slack: float = 2.0,
+        percentile: float = 0.95,
+        min_read: float = 10.0,
+        max_read: float = 180.0,
+        min_samples: int = 10,
+        window: int = 200,
+    ) -> None:
+        """Create a new timeout policy.
+
+        Args:
+        ----
+            overhead (float): Fixed part of the expected cost in seconds.
+            per_unit (float): Seconds of expected cost per unit of payload.
+            connect (float): Connect timeout in seconds.
+            slack (float): Safety factor applied to the learned latency.
+            percentile (float): Percentile of observed ratios, in (0, 1].
+            min_read (float): Lower bound of the read timeout in seconds.
+            max_read (float): Upper bound of the read timeout in seconds.
+            min_samples (int): Observations needed before the learned value is used.
+            window (int): Number of latest observations to learn from.
+
+        """
+        self.overhead = overhead
+        self.per_unit = per_unit
+        self.connect = connect
+        self.slack = slack
+        self.percentile = percentile
+        self.min_read = min_read
+        self.max_read = max_read
+        self.min_samples = min_samples
+        self.__ratios: deque[float] = deque(maxlen=window)
+        self.__lock = threading.Lock()
+
+    def cost(self: TimeoutPolicy, size: int) -> float:
+        """Return the expected cost of a call.
+
+        Args:
+        ----
+            size (int): Payload size.
+
+        Returns:
+        -------
+            float: Expected cost in seconds.
+
+        """
+        return self.overhead + self.per_unit * size
+
+    def ratio(self: TimeoutPolicy) -> float:
+        """Return the learned percentile of latency/cost ratios.
+
+        Returns
+        -------
+            float: Learned ratio, 1.0 until enough observations are collected.
+
+        """
+        with self.__lock:
+            if len(self.__ratios) < self.min_samples:
+                return 1.0
+            ratios = sorted(self.__ratios)
+
+        index = min(len(ratios) - 1, math.ceil(self.percentile * len(ratios)) - 1)
+        return ratios[index]
+
+    def timeout(self: TimeoutPolicy, size: int) -> tuple[float, float]:
+        """Return the (connect, read) timeout for a payload.
+
+        Args:
+        ----
+            size (int): Payload size.
+
+        Returns:
+        -------
+            tuple[float, float]: Connect and read timeouts in seconds.
+
+        """
+        read = self.cost(size) * self.ratio() * self.slack
+        return self.connect, min(self.max_read, max(self.min_read, read))
+
+    def observe(self: TimeoutPolicy, size: int, latency: float) -> None:
+        """Record the latency of a successful call.
+
+        Args:
+        ----
+            size (int): Payload size.
+            latency (float): Call latency in seconds.
+
+        """
+        with self.__lock:
+            self.__ratios.append(latency / self.cost(size))
+
+
+def httpx_timeout(timeout: float | tuple[float, float]) -> httpx.Timeout:
+    """Convert a requests-style timeout to an httpx one.
+
+    Args:
+    ----
+        timeout (float | tuple[float, float]): Timeout, or (connect, read)
+            timeouts, in seconds.
+
+    Returns:
+    -------
+        httpx.Timeout: The same timeout for httpx.
+
+    """
+    import httpx
+
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect)
+    return httpx.Timeout(timeout)
@@ -0,0 +1,157 @@
+"""Artifacts module."""
+
+from __future__ import annotations
+
+import base64
+import json
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from modules.cache import DiskCache
+    from modules.prompts import Prompt
+
+
+class Artifacts:
+    """Finished results of a note request.
+
+    Attributes
+    ----------
+        duration (int): Duration of the audio in minutes.
+        transcript (str): Text of the audio.
+        markdown (str): Note in markdown.
+        pdf (bytes): Note rendered to PDF.
+
+    """
+
+    def __init__(
+        self: Artifacts,
+        duration: int,
+        transcript: str,
+        markdown: str,
+        pdf: bytes,
+    ) -> None:
+        """Create new artifacts.
+
+        Args:
+        ----
+            duration (int): Duration of the audio in minutes.
+            transcript (str): Text of the audio.
+            markdown (str): Note in markdown.
+            pdf (bytes): Note rendered to PDF.
+
+        """
+        self.duration = duration
+        self.transcript = transcript
+        self.markdown = markdown
+        self.pdf = pdf
+
+    def to_bytes(self: Artifacts) -> bytes:
+        """Serialize the artifacts.
+
+        Returns
+        -------
+            bytes: JSON representation.
+
+        """
+        return json.dumps(
+            {
+                "duration": self.duration,
+                "transcript": self.transcript,
+                "markdown": self.markdown,
+                "pdf": base64.b64encode(self.pdf).decode(),
+            },
+        ).encode()
+
+    @classmethod
+    def from_bytes(cls: type[Artifacts], data: bytes) -> Artifacts:
+        """Deserialize the artifacts.
+
+        Args:
+        ----
+            data (bytes): JSON representation.
+
+        Returns:
+        -------
+            Artifacts: The artifacts.
+
+        """
+        fields = json.loads(data)
+        return cls(
+            duration=fields["duration"],
+            transcript=fields["transcript"],
+            markdown=fields["markdown"],
+            pdf=base64.b64decode(fields["pdf"]),
+        )
+
+
+class ArtifactIndex:
+    """Index from Telegram's `file_unique_id` to finished artifacts.
+
+    Forwards of the same file share `file_unique_id`, so a forwarded
+    recording can be answered without downloading or processing it.
+    Artifacts are also keyed by the names and digests of the prompts
+    the note was made with, so an edited prompt or another variant
+    is a miss.
+
+    Attributes
+    ----------
+        cache (DiskCache): Storage of the serialized artifacts.
+
+    """
+
+    def __init__(self: ArtifactIndex, cache: DiskCache) -> None:
+        """Create a new index.
+
+        Args:
+        ----
+            cache (DiskCache): Storage of the serialized artifacts.
+
+        """
+        self.cache = cache
+
+    def get(
+        self: ArtifactIndex,
+        file_unique_id: str,
+        prompts: tuple[Prompt, ...],
+    ) -> Artifacts | None:
+        """Return the artifacts of a file.
+
+        Args:
+        ----
+            file_unique_id (str): Telegram's stable ID of the file.
+            prompts (tuple[Prompt, ...]): Prompts the note is made with.
+
+        Returns:
+        -------
+            Artifacts | None: The artifacts, or None if the file is not indexed.
+
+        """
+        if not file_unique_id:
+            return None
+        data = self.cache.get(self.__key(file_unique_id, prompts))
+        return Artifacts.from_bytes(data) if data is not None else None
+
+    def put(
+        self: ArtifactIndex,
+        file_unique_id: str,
+        prompts: tuple[Prompt, ...],
+        artifacts: Artifacts,
+    ) -> None:
+        """Store the artifacts of a file.
+
+        Args:
+        ----
+            file_unique_id (str): Telegram's stable ID of the file.
+            prompts (tuple[Prompt, ...]): Prompts the note was made with.
+            artifacts (Artifacts): The artifacts.
+
+        """
+        if file_unique_id:
+            self.cache.put(self.__key(file_unique_id, prompts), artifacts.to_bytes())
+
+    @staticmethod
+    def __key(file_unique_id: str, prompts: tuple[Prompt, ...]) -> str:
+        """Return the cache key of a file and the prompts of its note."""
+        return "-".join(
+            [file_unique_id, *(f"{prompt.name}:{prompt.digest}" for prompt in prompts)],
+        )
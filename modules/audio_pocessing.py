@@ -6,10 +6,16 @@ import uuid
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-from pydub import AudioSegment  # type: ignore[import-untyped]
-
 if TYPE_CHECKING:
     from logging import Logger
+    from types import ModuleType
+
+
+def _pydub() -> ModuleType:
+    """Import pydub on first use, it is not needed to start the bot."""
+    import pydub  # type: ignore[import-untyped]
+
+    return pydub
 
 
 class AudioProcessing:
@@ -40,7 +46,7 @@ class AudioProcessing:
             tuple[int, str]: status code and path to mp3
 
         """
-        audio = AudioSegment.from_file(file_path)
+        audio = _pydub().AudioSegment.from_file(file_path)
         audio_path = Path(file_path)
         suffix = audio_path.suffix
 
@@ -60,27 +66,27 @@ class AudioProcessing:
 
         return 200, new_path
 
-    def to_chunks(self: AudioProcessing, file_path: str, user_id: int) -> int:
+    def to_chunks(self: AudioProcessing, file_path: str, chunks_dir: Path) -> int:
         """Split audio file into chunks.
 
         Args:
         ----
             self: AudioProcessing
             file_path (str): file path
-            user_id (int): user id
+            chunks_dir (Path): directory for the chunks, created if needed
 
         Returns:
         -------
             int: status code
 
         """
-        Path(f"data/chunks/{user_id}").mkdir()
+        chunks_dir.mkdir(parents=True, exist_ok=True)
 
         try:
-            audio = AudioSegment.from_mp3(file_path)
+            audio = _pydub().AudioSegment.from_mp3(file_path)
             for ind, start_time in enumerate(range(0, len(audio), self.splt_timeout)):
                 chunk = audio[start_time : start_time + self.splt_timeout]
-                chunk.export(f"data/chunks/{user_id}/{ind}.mp3", format="mp3")
+                chunk.export(chunks_dir / f"{ind}.mp3", format="mp3")
             Path(file_path).unlink()
             self.logger.info("Converted to chunks.", extra={"message_type": "server"})
         except Exception as e:  # noqa: BLE001
@@ -102,7 +108,7 @@ class AudioProcessing:
             file.write(file_data)
 
         try:
-            audio = AudioSegment.from_file(filename)
+            audio = _pydub().AudioSegment.from_file(filename)
             duration = audio.duration_seconds
             Path(filename).unlink()
         except Exception:  # noqa: BLE001
@@ -0,0 +1,221 @@
+"""Cache module."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+
+def content_hash(data: bytes | str) -> str:
+    """Return the hex SHA-256 digest of the content.
+
+    Args:
+    ----
+        data (bytes | str): Content to hash, strings are hashed as UTF-8.
+
+    Returns:
+    -------
+        str: Hex digest.
+
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+class DiskCache:
+    """Bounded on-disk key-value cache with LRU eviction and TTL.
+
+    Every entry is a file named after its key. The file modification time is
+    the write time, used for the TTL; the access time is bumped on every hit
+    and used for LRU eviction once the total size exceeds `max_bytes`.
+
+    Attributes
+    ----------
+        directory (Path): Directory of the cache files.
+        max_bytes (int): Maximum total size of the entries.
+        ttl (float): Lifetime of an entry in seconds.
+
+    """
+
+    def __init__(
+        self: DiskCache,
+        directory: str,
+        max_bytes: int,
+        ttl: float,
+    ) -> None:
+        """Create a new cache, reusing the entries already in the directory.
+
+        Args:
+        ----
+            directory (str): Directory of the cache files.
+            max_bytes (int): Maximum total size of the entries.
+            ttl (float): Lifetime of an entry in seconds.
+
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.__lock = threading.Lock()
+        self.__size = sum(path.stat().st_size for path in self.__entries())
+
+    def get(self: DiskCache, key: str) -> bytes | None:
+        """Return the cached value.
+
+        Args:
+        ----
+            key (str): Key of the entry.
+
+        Returns:
+        -------
+            bytes | None: The value, or None if missing or expired.
+
+        """
+        path = self.directory / key
+        with self.__lock:
+            try:
+                stat = path.stat()
+                if time.time() - stat.st_mtime > self.ttl:
+                    self.__remove(path)
+                    return None
+                value = path.read_bytes()
+                os.utime(path, (time.time(), stat.st_mtime))
+            except FileNotFoundError:
+                return None
+        return value
+
+    def put(self: DiskCache, key: str, value: bytes) -> None:
+        """Store a value, evicting the least recently used entries if needed.
+
+        Args:
+        ----
+            key (str): Key of the entry.
+            value (bytes): Value to store.
+
+        """
+        if len(value) > self.max_bytes:
+            return
+
+        path = self.directory / key
+        tmp_path = self.directory / f".{key}.{uuid.uuid4()}.tmp"
+        with self.__lock:
+            if path.exists():
+                self.__remove(path)
+            tmp_path.write_bytes(value)
+            tmp_path.replace(path)
+            self.__size += len(value)
+            if self.__size > self.max_bytes:
+                self.__evict()
+
+    def __entries(self: DiskCache) -> list[Path]:
+        """Return the paths of all entries."""
+        return [
+            path
+            for path in self.directory.iterdir()
+            if path.is_file() and not path.name.startswith((".", "__init__"))
+        ]
+
+    def __remove(self: DiskCache, path: Path) -> None:
+        """Remove an entry."""
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        self.__size -= size
+
+    def __evict(self: DiskCache) -> None:
+        """Remove expired entries, then least recently used ones."""
+        now = time.time()
+        entries = []
+        for path in self.__entries():
+            stat = path.stat()
+            if now - stat.st_mtime > self.ttl:
+                self.__remove(path)
+            else:
+                entries.append((stat.st_atime, path))
+
+        for _, path in sorted(entries):
+            if self.__size <= self.max_bytes:
+                break
+            self.__remove(path)
+
+
+class LRUCache:
+    """Bounded in-memory key-value cache with LRU eviction and TTL.
+
+    Attributes
+    ----------
+        max_entries (int): Maximum number of entries.
+        ttl (float): Lifetime of an entry in seconds.
+
+    """
+
+    def __init__(self: LRUCache, max_entries: int, ttl: float) -> None:
+        """Create a new empty cache.
+
+        Args:
+        ----
+            max_entries (int): Maximum number of entries.
+            ttl (float): Lifetime of an entry in seconds.
+
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.__entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self: LRUCache, key: Any) -> Any | None:  # noqa: ANN401
+        """Return the cached value.
+
+        Args:
+        ----
+            key (Any): Key of the entry.
+
+        Returns:
+        -------
+            Any | None: The value, or None if missing or expired.
+
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl:
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+    def put(self: LRUCache, key: Any, value: Any) -> None:  # noqa: ANN401
+        """Store a value, evicting the least recently used entry if needed.
+
+        Args:
+        ----
+            key (Any): Key of the entry.
+            value (Any): Value to store.
+
+        """
+        with self.__lock:
+            self.__entries[key] = (time.monotonic(), value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+    def invalidate(self: LRUCache, key: Any) -> None:  # noqa: ANN401
+        """Remove an entry.
+
+        Args:
+        ----
+            key (Any): Key of the entry.
+
+        """
+        with self.__lock:
+            self.__entries.pop(key, None)
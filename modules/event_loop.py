@@ -0,0 +1,144 @@
+"""Event loop module.
+
+Asyncio event loop that runs the I/O-bound pipeline stages.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Coroutine, TypeVar
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+    import httpx
+
+T = TypeVar("T")
+
+
+class EventLoopThread:
+    """Asyncio event loop running in a background thread.
+
+    Model calls run on it as coroutines sharing one pooled HTTP client,
+    so thousands of requests can wait on the network without a thread
+    each. Blocking and CPU-bound work is offloaded to an executor
+    with `offload`. Threads of the bot hand coroutines over with `submit`
+    and `run`.
+
+    Attributes
+    ----------
+        max_connections (int): Maximum number of open HTTP connections.
+
+    """
+
+    def __init__(
+        self: EventLoopThread,
+        logger: Logger,
+        max_connections: int = 100,
+        offload_workers: int | None = None,
+    ) -> None:
+        """Create the loop and start its thread.
+
+        Args:
+        ----
+            logger (CustomLogger): Logger instance for logging.
+            max_connections (int): Maximum number of open HTTP connections.
+            offload_workers (int | None): Threads for offloaded work,
+                None for the asyncio default.
+
+        """
+        self.logger = logger
+        self.max_connections = max_connections
+        self.__loop = asyncio.new_event_loop()
+        self.__loop.set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=offload_workers,
+                thread_name_prefix="offload",
+            ),
+        )
+        self.__client: httpx.AsyncClient | None = None
+        self.__thread = threading.Thread(
+            target=self.__loop.run_forever,
+            name="event-loop",
+            daemon=True,
+        )
+        self.__thread.start()
+
+    @property
+    def client(self: EventLoopThread) -> httpx.AsyncClient:
+        """Return the HTTP client of the loop, creating it on first use.
+
+        Must be used from coroutines running on the loop.
+
+        Returns
+        -------
+            httpx.AsyncClient: The HTTP client.
+
+        """
+        if self.__client is None:
+            import httpx
+
+            self.__client = httpx.AsyncClient(
+                # Same as the blocking model calls
+                verify=False,  # noqa: S501
+                limits=httpx.Limits(max_connections=self.max_connections),
+            )
+        return self.__client
+
+    def submit(self: EventLoopThread, coroutine: Coroutine[Any, Any, T]) -> Future[T]:
+        """Schedule a coroutine on the loop from any thread.
+
+        Args:
+        ----
+            coroutine (Coroutine): The coroutine.
+
+        Returns:
+        -------
+            Future: Future of the coroutine result.
+
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.__loop)
+
+    def run(self: EventLoopThread, coroutine: Coroutine[Any, Any, T]) -> T:
+        """Run a coroutine on the loop and wait for its result.
+
+        Must not be called from the loop thread.
+
+        Args:
+        ----
+            coroutine (Coroutine): The coroutine.
+
+        Returns:
+        -------
+            T: Result of the coroutine.
+
+        """
+        return self.submit(coroutine).result()
+
+    async def offload(
+        self: EventLoopThread,
+        func: Callable[..., T],
+        *args: Any,  # noqa: ANN401
+    ) -> T:
+        """Run blocking or CPU-bound work in the executor.
+
+        Args:
+        ----
+            func (Callable): The function.
+            *args: Positional arguments of the function.
+
+        Returns:
+        -------
+            T: Result of the function.
+
+        """
+        return await self.__loop.run_in_executor(None, func, *args)
+
+    def stop(self: EventLoopThread) -> None:
+        """Close the HTTP client and stop the loop."""
+        if self.__client is not None:
+            self.run(self.__client.aclose())
+        self.__loop.call_soon_threadsafe(self.__loop.stop)
+        self.__thread.join()
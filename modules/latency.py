@@ -0,0 +1,109 @@
+"""Latency module.
+
+Latency of the Telegram update handlers.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+
+class LatencyRecorder:
+    """Keeps the latest latencies of a handler and logs their percentiles.
+
+    Every `report_every` observations the median, 95th percentile and
+    maximum of the last `window` latencies are logged. A single latency
+    above `slow_after` is logged at once as a warning.
+
+    Attributes
+    ----------
+        name (str): Name of the handler.
+        window (int): Number of latest latencies kept.
+        report_every (int): Number of observations between reports.
+        slow_after (float): Latency in seconds that is logged as slow.
+
+    """
+
+    def __init__(
+        self: LatencyRecorder,
+        name: str,
+        logger: Logger,
+        window: int = 1000,
+        report_every: int = 100,
+        slow_after: float = 0.5,
+    ) -> None:
+        """Create a new recorder.
+
+        Args:
+        ----
+            name (str): Name of the handler.
+            logger (CustomLogger): Logger instance for logging.
+            window (int): Number of latest latencies kept.
+            report_every (int): Number of observations between reports.
+            slow_after (float): Latency in seconds that is logged as slow.
+
+        """
+        self.name = name
+        self.logger = logger
+        self.window = window
+        self.report_every = report_every
+        self.slow_after = slow_after
+        self.__latencies: deque[float] = deque(maxlen=window)
+        self.__count = 0
+        self.__lock = threading.Lock()
+
+    def observe(self: LatencyRecorder, seconds: float) -> None:
+        """Record the latency of one call.
+
+        Args:
+        ----
+            seconds (float): Latency in seconds.
+
+        """
+        if seconds > self.slow_after:
+            self.logger.warning(
+                "Slow %s handler: %.0f ms.",
+                self.name,
+                seconds * 1000,
+                extra={"message_type": "server"},
+            )
+
+        with self.__lock:
+            self.__latencies.append(seconds)
+            self.__count += 1
+            if self.__count % self.report_every:
+                return
+            report = (
+                f"{self.name} handler latency over {len(self.__latencies)} calls: "
+                f"p50 {self.__percentile(0.5) * 1000:.1f} ms, "
+                f"p95 {self.__percentile(0.95) * 1000:.1f} ms, "
+                f"max {max(self.__latencies) * 1000:.1f} ms."
+            )
+        self.logger.info(report, extra={"message_type": "server"})
+
+    def percentile(self: LatencyRecorder, q: float) -> float:
+        """Return a percentile of the latest latencies.
+
+        Args:
+        ----
+            q (float): The percentile, from 0 to 1.
+
+        Returns:
+        -------
+            float: The latency in seconds, 0 if nothing was recorded.
+
+        """
+        with self.__lock:
+            return self.__percentile(q)
+
+    def __percentile(self: LatencyRecorder, q: float) -> float:
+        """Return a percentile of the latest latencies, under the lock."""
+        if not self.__latencies:
+            return 0.0
+        ordered = sorted(self.__latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
@@ -0,0 +1,135 @@
+"""Live message module."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from modules.outbox import Outbox
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+    from logging import Logger
+
+# Maximum length of a Telegram text message
+MAX_MESSAGE_LENGTH = 4096
+
+
+class LiveMessage:
+    """Telegram message that is edited in place as its text grows.
+
+    The first update sends the message, later updates edit it.
+    Edits are throttled to stay within the Bot API limits: an update that
+    comes sooner than `min_interval` seconds after the previous edit is
+    only remembered and shown by a later update or by `flush`.
+    The message is never merged with other messages in the outbox,
+    edits are not waited for.
+
+    Attributes
+    ----------
+        outbox (Outbox): Outbox the message is sent through.
+        chat_id (int): Chat to send the message to.
+        min_interval (float): Minimum interval between edits in seconds.
+        priority (int): Outbox lane of the message and its edits.
+        message_id (int | None): ID of the sent message.
+
+    """
+
+    def __init__(
+        self: LiveMessage,
+        outbox: Outbox,
+        chat_id: int,
+        logger: Logger,
+        min_interval: float = 3.0,
+        priority: int = Outbox.RESULT,
+    ) -> None:
+        """Create a new live message.
+
+        Args:
+        ----
+            outbox (Outbox): Outbox the message is sent through.
+            chat_id (int): Chat to send the message to.
+            logger (CustomLogger): Logger instance for logging.
+            min_interval (float): Minimum interval between edits in seconds.
+            priority (int): Outbox lane of the message and its edits.
+
+        """
+        self.outbox = outbox
+        self.chat_id = chat_id
+        self.logger = logger
+        self.min_interval = min_interval
+        self.priority = priority
+        self.message_id: int | None = None
+        self.__text = ""
+        self.__shown = ""
+        self.__edited_at = 0.0
+        self.__lock = threading.Lock()
+
+    def update(self: LiveMessage, text: str) -> None:
+        """Set the message text, editing the message if the throttle allows.
+
+        Args:
+        ----
+            text (str): New text of the message.
+
+        """
+        with self.__lock:
+            self.__text = text
+            if time.monotonic() - self.__edited_at >= self.min_interval:
+                self.__show()
+
+    def flush(self: LiveMessage) -> None:
+        """Show the latest text regardless of the throttle."""
+        with self.__lock:
+            self.__show()
+
+    def __show(self: LiveMessage) -> None:
+        """Send or edit the message with the latest text."""
+        text = self.__text
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[: MAX_MESSAGE_LENGTH - 1] + "…"
+        if not text.strip() or text == self.__shown:
+            return
+
+        self.__edited_at = time.monotonic()
+        if self.message_id is None:
+            # The ID is needed for the edits, so the first send is waited for
+            try:
+                self.message_id = (
+                    self.outbox.send_message(
+                        self.chat_id,
+                        text,
+                        priority=self.priority,
+                        coalesce=False,
+                    )
+                    .result()
+                    .message_id
+                )
+            except Exception as e:  # noqa: BLE001
+                self.__log_failure(e)
+                return
+        else:
+            self.outbox.call(
+                self.chat_id,
+                "edit_message_text",
+                text,
+                chat_id=self.chat_id,
+                message_id=self.message_id,
+                priority=self.priority,
+            ).add_done_callback(self.__edited)
+
+        self.__shown = text
+
+    def __edited(self: LiveMessage, future: Future) -> None:
+        """Log a failed edit."""
+        if not future.cancelled() and future.exception() is not None:
+            self.__log_failure(future.exception())  # type: ignore[arg-type]
+
+    def __log_failure(self: LiveMessage, error: BaseException) -> None:
+        """Log a failed send or edit, the note is delivered as files anyway."""
+        self.logger.info(
+            "Live message update failed: %s",
+            error,
+            extra={"message_type": "server"},
+        )
@@ -0,0 +1,441 @@
+"""Outbox module.
+
+Rate-limited dispatcher of outbound Telegram calls.
+"""
+
+from __future__ import annotations
+
+import heapq
+import io
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+
+import telebot  # type: ignore[import-untyped]
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+# Telegram's code for flood limits
+TOO_MANY_REQUESTS = 429
+
+# Maximum length of a Telegram text message
+MAX_MESSAGE_LENGTH = 4096
+
+
+class TokenBucket:
+    """Token bucket rate limiter, not thread-safe.
+
+    Attributes
+    ----------
+        rate (float): Tokens added per second.
+        burst (float): Maximum number of tokens.
+
+    """
+
+    def __init__(self: TokenBucket, rate: float, burst: float) -> None:
+        """Create a full bucket.
+
+        Args:
+        ----
+            rate (float): Tokens added per second.
+            burst (float): Maximum number of tokens.
+
+        """
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = burst
+        self.__updated = time.monotonic()
+
+    def wait_time(self: TokenBucket, now: float) -> float:
+        """Return the seconds until a token is available.
+
+        Args:
+        ----
+            now (float): Current monotonic time.
+
+        Returns:
+        -------
+            float: Seconds to wait, 0 if a token is available.
+
+        """
+        refill = (now - self.__updated) * self.rate
+        self.__tokens = min(self.burst, self.__tokens + refill)
+        self.__updated = now
+        return 0.0 if self.__tokens >= 1 else (1 - self.__tokens) / self.rate
+
+    def take(self: TokenBucket) -> None:
+        """Take a token, call after `wait_time` returned 0."""
+        self.__tokens -= 1
+
+
+class _Job:
+    """Outbound call waiting in the outbox."""
+
+    def __init__(
+        self: _Job,
+        priority: int,
+        chat_id: int,
+        method: str,
+        args: tuple,
+        kwargs: dict,
+    ) -> None:
+        self.priority = priority
+        self.chat_id = chat_id
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+        self.attempts = 0
+        self.order = 0
+
+    def coalesce(self: _Job, text: str) -> bool:
+        """Append the text of a following status message, if it fits."""
+        if self.method != "send_message" or self.kwargs:
+            return False
+        chat_id, pending_text = self.args
+        merged = f"{pending_text}\n\n{text}"
+        if len(merged) > MAX_MESSAGE_LENGTH:
+            return False
+        self.args = (chat_id, merged)
+        return True
+
+    def rewind(self: _Job) -> None:
+        """Rewind the streams of uploaded files, read by the previous attempt."""
+        for value in (*self.args, *self.kwargs.values()):
+            stream = (
+                value.file if isinstance(value, telebot.types.InputFile) else value
+            )
+            if isinstance(stream, io.IOBase) and stream.seekable():
+                stream.seek(0)
+
+
+class Outbox:
+    """Central dispatcher of outbound Telegram calls.
+
+    Calls are queued and sent by a pool of workers within a global and a
+    per-chat token bucket, so bursts do not hit Telegram's flood limits.
+    Results are sent ahead of status messages. A status message to a chat
+    that still has an unsent status message is merged into it.
+    Calls answered with 429 are retried after the `retry_after` delay,
+    and the chat gets nothing else until then. One call per chat is in
+    flight at a time, so messages to a chat keep their order within a lane.
+
+    Attributes
+    ----------
+        bot (telebot.TeleBot): The Telegram bot instance.
+        max_attempts (int): Maximum number of attempts of a call.
+
+    """
+
+    # Priority lanes, lower is sent first
+    RESULT = 0
+    STATUS = 1
+
+    def __init__(  # type: ignore[no-any-unimported]  # noqa: PLR0913
+        self: Outbox,
+        bot: telebot.TeleBot,
+        logger: Logger,
+        global_rate: float = 25.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        workers: int = 8,
+        max_attempts: int = 5,
+    ) -> None:
+        """Create the outbox and start its dispatcher.
+
+        Args:
+        ----
+            bot (telebot.TeleBot): The Telegram bot instance.
+            logger (CustomLogger): Logger instance for logging.
+            global_rate (float): Calls per second to all chats.
+            chat_rate (float): Calls per second to one chat.
+            chat_burst (float): Calls to one chat that may be sent at once.
+            workers (int): Number of sending threads.
+            max_attempts (int): Maximum number of attempts of a call.
+
+        """
+        self.bot = bot
+        self.logger = logger
+        self.max_attempts = max_attempts
+        self.__chat_rate = chat_rate
+        self.__chat_burst = chat_burst
+        self.__global = TokenBucket(global_rate, global_rate)
+        self.__chats: dict[int, TokenBucket] = {}
+        self.__blocked_until: dict[int, float] = {}
+        self.__busy: set[int] = set()
+        # Unsent status messages, by chat
+        self.__status: dict[int, _Job] = {}
+        self.__heap: list[tuple[int, int, _Job]] = []
+        self.__order = itertools.count(1)
+        self.__condition = threading.Condition()
+        self.__stopped = False
+        self.__senders = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="outbox",
+        )
+        threading.Thread(target=self.__dispatch, name="outbox", daemon=True).start()
+
+    def send_message(
+        self: Outbox,
+        chat_id: int,
+        text: str,
+        priority: int = STATUS,
+        coalesce: bool = True,  # noqa: FBT001, FBT002
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Future:
+        """Queue a text message.
+
+        Args:
+        ----
+            chat_id (int): Chat to send the message to.
+            text (str): Text of the message.
+            priority (int): Lane of the message, `RESULT` or `STATUS`.
+            coalesce (bool): Whether a status message may be merged with
+                other status messages, False for messages that are edited later.
+            **kwargs: Other arguments of `TeleBot.send_message`.
+
+        Returns:
+        -------
+            Future: Future of the sent message. Coalesced status messages
+                share the future of the merged message.
+
+        """
+        if priority == self.STATUS and coalesce and not kwargs:
+            job = _Job(priority, chat_id, "send_message", (chat_id, text), {})
+            with self.__condition:
+                if self.__stopped:
+                    job.future.cancel()
+                    return job.future
+                pending = self.__status.get(chat_id)
+                if pending is not None and pending.coalesce(text):
+                    return pending.future
+                self.__status[chat_id] = job
+                self.__push(job)
+            return job.future
+
+        return self.call(
+            chat_id,
+            "send_message",
+            chat_id,
+            text,
+            priority=priority,
+            **kwargs,
+        )
+
+    def send_document(
+        self: Outbox,
+        chat_id: int,
+        document: Any,  # noqa: ANN401
+        priority: int = RESULT,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Future:
+        """Queue a document.
+
+        Args:
+        ----
+            chat_id (int): Chat to send the document to.
+            document (Any): The document, e.g. `telebot.types.InputFile`.
+            priority (int): Lane of the document, `RESULT` or `STATUS`.
+            **kwargs: Other arguments of `TeleBot.send_document`.
+
+        Returns:
+        -------
+            Future: Future of the sent message.
+
+        """
+        return self.call(
+            chat_id,
+            "send_document",
+            chat_id,
+            document,
+            priority=priority,
+            **kwargs,
+        )
+
+    def call(
+        self: Outbox,
+        chat_id: int,
+        method: str,
+        /,
+        *args: Any,  # noqa: ANN401
+        priority: int = STATUS,
+        **kwargs: Any,  # noqa: ANN401
+    ) -> Future:
+        """Queue any bot method that sends to a chat.
+
+        Args:
+        ----
+            chat_id (int): Chat the call is limited by.
+            method (str): Name of the `TeleBot` method.
+            *args: Positional arguments of the method.
+            priority (int): Lane of the call, `RESULT` or `STATUS`.
+            **kwargs: Keyword arguments of the method, may include
+                its own `chat_id`.
+
+        Returns:
+        -------
+            Future: Future of the method result, cancelled if the outbox
+                is stopped.
+
+        """
+        job = _Job(priority, chat_id, method, args, kwargs)
+        with self.__condition:
+            if self.__stopped:
+                job.future.cancel()
+                return job.future
+            self.__push(job)
+        return job.future
+
+    def stop(self: Outbox, timeout: float = 10.0) -> int:
+        """Send the queued calls and stop the dispatcher.
+
+        Waits until every queued call is sent or `timeout` passes.
+        Calls that are still queued then are cancelled.
+
+        Args:
+        ----
+            timeout (float): Maximum time to wait in seconds.
+
+        Returns:
+        -------
+            int: Number of cancelled calls.
+
+        """
+        deadline = time.monotonic() + timeout
+        with self.__condition:
+            while self.__heap or self.__busy:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.__condition.wait(remaining)
+
+            self.__stopped = True
+            dropped = [job for _, _, job in self.__heap]
+            self.__heap.clear()
+            self.__status.clear()
+            self.__condition.notify_all()
+
+        for job in dropped:
+            job.future.cancel()
+        self.__senders.shutdown(wait=False)
+        if dropped:
+            self.logger.warning(
+                "Outbox stopped with %s unsent calls.",
+                len(dropped),
+                extra={"message_type": "server"},
+            )
+        return len(dropped)
+
+    def __push(self: Outbox, job: _Job) -> None:
+        """Add a job to the heap, under the condition.
+
+        A retried job keeps its place in the order.
+        """
+        if not job.order:
+            job.order = next(self.__order)
+        heapq.heappush(self.__heap, (job.priority, job.order, job))
+        self.__condition.notify_all()
+
+    def __dispatch(self: Outbox) -> None:
+        """Hand jobs to the senders as the limits allow."""
+        while True:
+            with self.__condition:
+                if self.__stopped:
+                    return
+                job, delay = self.__next_job()
+                if job is None:
+                    self.__condition.wait(delay)
+                    continue
+            self.__senders.submit(self.__send, job)
+
+    def __next_job(self: Outbox) -> tuple[_Job | None, float | None]:
+        """Pop the first job that may be sent now, under the condition.
+
+        Returns the job, or None and the seconds to wait for one
+        (None to wait for a new job or a finished call).
+        """
+        if not self.__heap:
+            return None, None
+
+        now = time.monotonic()
+        delay = self.__global.wait_time(now)
+        if delay > 0:
+            return None, delay
+
+        wait = None
+        deferred = []
+        found = None
+        while self.__heap:
+            entry = heapq.heappop(self.__heap)
+            chat_delay = self.__chat_delay(entry[2].chat_id, now)
+            if chat_delay == 0:
+                found = entry[2]
+                break
+            deferred.append(entry)
+            if chat_delay is not None:
+                wait = chat_delay if wait is None else min(wait, chat_delay)
+
+        for entry in deferred:
+            heapq.heappush(self.__heap, entry)
+        if found is None:
+            return None, wait
+
+        self.__global.take()
+        self.__chats[found.chat_id].take()
+        self.__busy.add(found.chat_id)
+        if self.__status.get(found.chat_id) is found:
+            del self.__status[found.chat_id]
+        return found, None
+
+    def __chat_delay(self: Outbox, chat_id: int, now: float) -> float | None:
+        """Return the seconds until a chat may get a call, None if it is busy."""
+        if chat_id in self.__busy:
+            return None
+        blocked = self.__blocked_until.get(chat_id, 0.0) - now
+        if blocked > 0:
+            return blocked
+        bucket = self.__chats.get(chat_id)
+        if bucket is None:
+            bucket = self.__chats[chat_id] = TokenBucket(
+                self.__chat_rate,
+                self.__chat_burst,
+            )
+        return bucket.wait_time(now)
+
+    def __send(self: Outbox, job: _Job) -> None:
+        """Make the call and settle its future, or queue it again after a 429."""
+        if job.attempts:
+            job.rewind()
+        job.attempts += 1
+        retry = False
+        try:
+            result = getattr(self.bot, job.method)(*job.args, **job.kwargs)
+        except telebot.apihelper.ApiTelegramException as e:
+            if e.error_code == TOO_MANY_REQUESTS and job.attempts < self.max_attempts:
+                retry_after = e.result_json.get("parameters", {}).get("retry_after", 1)
+                self.logger.info(
+                    "Flood limit in chat %s, retry in %ss.",
+                    job.chat_id,
+                    retry_after,
+                    extra={"message_type": "server"},
+                )
+                with self.__condition:
+                    self.__blocked_until[job.chat_id] = time.monotonic() + retry_after
+                retry = True
+            else:
+                job.future.set_exception(e)
+        except Exception as e:  # noqa: BLE001
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+
+        with self.__condition:
+            self.__busy.discard(job.chat_id)
+            if retry and self.__stopped:
+                job.future.cancel()
+            elif retry:
+                self.__push(job)
+            self.__condition.notify_all()
@@ -0,0 +1,137 @@
+"""Progress module.
+
+One message per request that shows how far its processing is.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING
+
+from modules.live_message import LiveMessage
+from modules.outbox import Outbox
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+
+def format_eta(seconds: float) -> str:
+    """Format a remaining time for the user.
+
+    Args:
+    ----
+        seconds (float): Remaining time in seconds.
+
+    Returns:
+    -------
+        str: The time in minutes.
+
+    """
+    minutes = round(seconds / 60)
+    return "<1 минуты" if minutes == 0 else f"{minutes} мин"
+
+
+class ProgressTracker:
+    """Progress of one request, shown in a single edited message.
+
+    Pipeline stages report the stage they start with `stage` and the parts
+    they finished with `progress`. The message shows the stage, k of N
+    parts and the remaining time, estimated from the pace of the stage.
+    Edits are throttled by `LiveMessage` and sent in the status lane of
+    the outbox. A new stage is shown right away, stages are few.
+
+    Attributes
+    ----------
+        chat_id (int): Chat of the request.
+
+    """
+
+    def __init__(
+        self: ProgressTracker,
+        outbox: Outbox,
+        chat_id: int,
+        logger: Logger,
+        min_interval: float = 3.0,
+    ) -> None:
+        """Create a tracker, the message is sent on the first stage.
+
+        Args:
+        ----
+            outbox (Outbox): Outbox the message is sent through.
+            chat_id (int): Chat of the request.
+            logger (CustomLogger): Logger instance for logging.
+            min_interval (float): Minimum interval between edits in seconds.
+
+        """
+        self.chat_id = chat_id
+        self.__message = LiveMessage(
+            outbox,
+            chat_id,
+            logger,
+            min_interval=min_interval,
+            priority=Outbox.STATUS,
+        )
+        self.__stage = ""
+        self.__detail = ""
+        self.__done = 0
+        self.__total = 0
+        self.__started_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def stage(self: ProgressTracker, name: str, detail: str = "") -> None:
+        """Start a new stage.
+
+        Args:
+        ----
+            name (str): Name of the stage.
+            detail (str): Extra line shown under the stage.
+
+        """
+        with self.__lock:
+            self.__stage = name
+            self.__detail = detail
+            self.__done = 0
+            self.__total = 0
+            self.__started_at = time.monotonic()
+            self.__message.update(self.__text())
+            self.__message.flush()
+
+    def progress(self: ProgressTracker, done: int, total: int) -> None:
+        """Report the parts of the stage that are finished.
+
+        Args:
+        ----
+            done (int): Number of finished parts.
+            total (int): Number of parts of the stage.
+
+        """
+        with self.__lock:
+            self.__done = done
+            self.__total = total
+            self.__message.update(self.__text())
+
+    def finish(self: ProgressTracker, text: str) -> None:
+        """Replace the progress with the final text, e.g. the result or an error.
+
+        Args:
+        ----
+            text (str): Final text of the message.
+
+        """
+        with self.__lock:
+            self.__message.update(text)
+            self.__message.flush()
+
+    def __text(self: ProgressTracker) -> str:
+        """Render the message text."""
+        lines = [f"Этап: {self.__stage}"]
+        if self.__detail:
+            lines.append(self.__detail)
+        if self.__total:
+            lines.append(f"Готово частей: {self.__done} из {self.__total}")
+        if 0 < self.__done < self.__total:
+            elapsed = time.monotonic() - self.__started_at
+            eta = elapsed / self.__done * (self.__total - self.__done)
+            lines.append(f"Осталось примерно: {format_eta(eta)}")
+        return "\n".join(lines)
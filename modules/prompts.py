@@ -0,0 +1,115 @@
+"""Prompts module."""
+
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from modules.cache import content_hash
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+
+class Prompt:
+    """Instruction template loaded from a file.
+
+    Attributes
+    ----------
+        name (str): Name of the prompt variant.
+        text (str): Text of the prompt.
+        digest (str): Content hash of the text, used in cache keys.
+
+    """
+
+    def __init__(self: Prompt, name: str, text: str) -> None:
+        """Create a new prompt.
+
+        Args:
+        ----
+            name (str): Name of the prompt variant.
+            text (str): Text of the prompt.
+
+        """
+        self.name = name
+        self.text = text
+        self.digest = content_hash(text)
+
+
+class PromptRegistry:
+    """Named prompt variants kept in memory.
+
+    All prompts are read once at startup. `get` only checks the file
+    modification time and reloads the prompt when the file has changed.
+
+    Attributes
+    ----------
+        paths (dict[str, Path]): Files of the prompts by name.
+
+    """
+
+    def __init__(
+        self: PromptRegistry,
+        paths: dict[str, str],
+        logger: Logger,
+    ) -> None:
+        """Create a new registry and load the prompts.
+
+        Args:
+        ----
+            paths (dict[str, str]): Files of the prompts by name.
+            logger (CustomLogger): Logger instance for logging.
+
+        """
+        self.paths = {name: Path(path) for name, path in paths.items()}
+        self.logger = logger
+        self.__prompts: dict[str, tuple[float, Prompt]] = {}
+        self.__lock = threading.Lock()
+
+        for name in self.paths:
+            self.get(name)
+
+    @property
+    def names(self: PromptRegistry) -> list[str]:
+        """Return the names of the prompt variants.
+
+        Returns
+        -------
+            list[str]: Names of the prompts.
+
+        """
+        return list(self.paths)
+
+    def get(self: PromptRegistry, name: str) -> Prompt:
+        """Return a prompt, reloading it if its file has changed.
+
+        Args:
+        ----
+            name (str): Name of the prompt variant.
+
+        Returns:
+        -------
+            Prompt: The prompt.
+
+        Raises:
+        ------
+            ValueError: If the prompt name is unknown.
+
+        """
+        if name not in self.paths:
+            msg = f"Unknown prompt {name}."
+            raise ValueError(msg)
+
+        path = self.paths[name]
+        mtime = path.stat().st_mtime
+        with self.__lock:
+            loaded = self.__prompts.get(name)
+            if loaded is not None and loaded[0] == mtime:
+                return loaded[1]
+
+            prompt = Prompt(name, path.read_text())
+            self.__prompts[name] = (mtime, prompt)
+
+        self.logger.info("Prompt %s loaded.", name, extra={"message_type": "server"})
+        return prompt
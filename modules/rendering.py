@@ -0,0 +1,220 @@
+"""Rendering module.
+
+Markdown to PDF rendering in a pool of pre-warmed worker processes.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from importlib.metadata import version
+from typing import TYPE_CHECKING, Any
+
+from modules.cache import content_hash
+
+if TYPE_CHECKING:
+    from modules.cache import DiskCache
+
+# Markdown extras md2pdf used, kept for identical output
+MARKDOWN_EXTRAS = ["cuddled-lists", "tables", "footnotes"]
+
+# State of a worker process, filled by the initializer
+_worker: dict[str, Any] = {}
+
+
+class EmptyMarkdownError(ValueError):
+    """Raised when the markdown renders to an empty document."""
+
+
+def _init_worker(stylesheet: str) -> None:
+    """Import the renderer and load fonts and stylesheets once per worker."""
+    from weasyprint import CSS, HTML  # type: ignore[import-untyped]
+    from weasyprint.text.fonts import FontConfiguration  # type: ignore[import-untyped]
+
+    font_config = FontConfiguration()
+    _worker["font_config"] = font_config
+    _worker["stylesheets"] = (
+        [CSS(string=stylesheet, font_config=font_config)] if stylesheet else []
+    )
+
+    # Warm up font discovery and layout
+    HTML(string="<h1>Speech2Note</h1><p>warm-up</p>").write_pdf(
+        stylesheets=_worker["stylesheets"],
+        font_config=font_config,
+    )
+
+
+def _render(markdown: str) -> bytes:
+    """Render markdown to PDF bytes in a worker process."""
+    from markdown2 import markdown as markdown_to_html  # type: ignore[import-untyped]
+    from weasyprint import HTML  # type: ignore[import-untyped]
+
+    raw_html = markdown_to_html(markdown, extras=MARKDOWN_EXTRAS) if markdown else ""
+    if not raw_html:
+        msg = "Input markdown seems empty"
+        raise EmptyMarkdownError(msg)
+
+    return HTML(string=raw_html).write_pdf(  # type: ignore[no-any-return]
+        stylesheets=_worker["stylesheets"],
+        font_config=_worker["font_config"],
+    )
+
+
+def _ready() -> bool:
+    """Check that a worker process is started."""
+    return True
+
+
+class PdfRenderer:
+    """Renders markdown to PDF in a process pool.
+
+    Every worker imports weasyprint and loads fonts and stylesheets once,
+    when the pool is created, so a render only pays for the layout.
+    Rendering does not hold the GIL of the bot process.
+    Rendered documents are cached by hash of the markdown, the stylesheet
+    and the renderer version. If a worker dies, e.g. killed by the OOM
+    killer, the pool is rebuilt and the render is retried once.
+
+    Attributes
+    ----------
+        workers (int): Number of worker processes.
+        stylesheet (str): CSS applied to every document.
+        cache (DiskCache | None): Cache of the rendered documents.
+        version (str): Version of the rendering libraries.
+
+    """
+
+    def __init__(
+        self: PdfRenderer,
+        workers: int = 2,
+        stylesheet: str = "",
+        cache: DiskCache | None = None,
+    ) -> None:
+        """Create the pool and start the workers.
+
+        The pool should be created before other threads are started,
+        because the workers are forked from the current process.
+
+        Args:
+        ----
+            workers (int): Number of worker processes.
+            stylesheet (str): CSS applied to every document.
+            cache (DiskCache | None): Cache of the rendered documents.
+
+        """
+        self.workers = workers
+        self.stylesheet = stylesheet
+        self.cache = cache
+        self.version = (
+            f"weasyprint-{version('weasyprint')}-markdown2-{version('markdown2')}"
+        )
+        self.__key_prefix = f"{self.version}\0{content_hash(stylesheet)}\0"
+        self.__lock = threading.Lock()
+        self.__executor = self.__create_pool()
+
+    def render(self: PdfRenderer, markdown: str) -> Future:
+        """Schedule rendering of a markdown document.
+
+        Args:
+        ----
+            markdown (str): Markdown document.
+
+        Returns:
+        -------
+            Future: Future of the PDF bytes. It raises EmptyMarkdownError
+                if the markdown renders to an empty document.
+
+        """
+        key = content_hash(self.__key_prefix + markdown)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            future: Future = Future()
+            future.set_result(cached)
+            return future
+
+        future = Future()
+        self.__submit(markdown, key, future, retry=True)
+        return future
+
+    def __create_pool(self: PdfRenderer) -> ProcessPoolExecutor:
+        """Create a pool and start all workers now instead of on the first renders."""
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(self.stylesheet,),
+        )
+        for _ in range(self.workers):
+            executor.submit(_ready)
+        return executor
+
+    def __rebuild(self: PdfRenderer, broken: ProcessPoolExecutor) -> None:
+        """Replace a broken pool, unless another render has replaced it already."""
+        with self.__lock:
+            if self.__executor is not broken:
+                return
+            broken.shutdown(wait=False)
+            self.__executor = self.__create_pool()
+
+    def __submit(
+        self: PdfRenderer,
+        markdown: str,
+        key: str,
+        future: Future,
+        retry: bool,  # noqa: FBT001
+    ) -> None:
+        """Submit a render to the pool and pass its outcome to the future."""
+        with self.__lock:
+            executor = self.__executor
+        try:
+            rendering = executor.submit(_render, markdown)
+        except BrokenProcessPool as error:
+            self.__retry(markdown, key, future, executor, retry, error)
+            return
+        rendering.add_done_callback(
+            lambda done: self.__complete(markdown, key, future, executor, retry, done),
+        )
+
+    def __retry(  # noqa: PLR0913
+        self: PdfRenderer,
+        markdown: str,
+        key: str,
+        future: Future,
+        executor: ProcessPoolExecutor,
+        retry: bool,  # noqa: FBT001
+        error: BrokenProcessPool,
+    ) -> None:
+        """Rebuild the broken pool and render again, or fail the future."""
+        self.__rebuild(executor)
+        if retry:
+            self.__submit(markdown, key, future, retry=False)
+        elif not future.cancelled():
+            future.set_exception(error)
+
+    def __complete(  # noqa: PLR0913
+        self: PdfRenderer,
+        markdown: str,
+        key: str,
+        future: Future,
+        executor: ProcessPoolExecutor,
+        retry: bool,  # noqa: FBT001
+        rendering: Future,
+    ) -> None:
+        """Pass the outcome of a render to the future and cache the document."""
+        if future.cancelled():
+            return
+        if rendering.cancelled():
+            future.cancel()
+            return
+
+        error = rendering.exception()
+        if isinstance(error, BrokenProcessPool):
+            self.__retry(markdown, key, future, executor, retry, error)
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            if self.cache is not None:
+                self.cache.put(key, rendering.result())
+            future.set_result(rendering.result())
@@ -12,16 +12,24 @@ class Request:
         file_id (str): ID of the file to process.
         user_id (int): ID of the user who sent the request.
         duration (int): Duration of the file in seconds.
+        file_unique_id (str): Telegram's stable ID of the file, same for forwards.
+        prompt (str): Name of the instruction variant for the note.
+        reservation (str): ID of the token reservation that pays for the request.
+        job_id (str): ID of the job, shared by its to_text and to_note requests.
 
     """
 
-    def __init__(
+    def __init__(  # noqa: PLR0913
         self: Request,
         request_type: str,
         file_id: str,
         file_name: str,
         user_id: int,
         duration: int,
+        file_unique_id: str = "",
+        prompt: str = "default",
+        reservation: str = "",
+        job_id: str = "",
     ) -> None:
         """Create a new request.
 
@@ -32,6 +40,10 @@ class Request:
             file_name (str): Name of the file to process.
             user_id (int): ID of the user who sent the request.
             duration (int): Duration of the file in seconds.
+            file_unique_id (str): Telegram's stable ID of the file, same for forwards.
+            prompt (str): Name of the instruction variant for the note.
+            reservation (str): ID of the token reservation that pays for the request.
+            job_id (str): ID of the job, shared by its to_text and to_note requests.
 
         Raises:
         ------
@@ -47,6 +59,10 @@ class Request:
         self.__user_id = user_id
         self.__request_type = request_type
         self.__duration = duration
+        self.__file_unique_id = file_unique_id
+        self.__prompt = prompt
+        self.__reservation = reservation
+        self.__job_id = job_id
 
     @property
     def request_type(self: Request) -> str:
@@ -102,3 +118,47 @@ class Request:
 
         """
         return self.__duration
+
+    @property
+    def file_unique_id(self: Request) -> str:
+        """Return the unique file ID.
+
+        Returns
+        -------
+            str: Telegram's stable ID of the file, empty if unknown.
+
+        """
+        return self.__file_unique_id
+
+    @property
+    def prompt(self: Request) -> str:
+        """Return the name of the instruction variant.
+
+        Returns
+        -------
+            str: The name of the instruction variant for the note.
+
+        """
+        return self.__prompt
+
+    @property
+    def reservation(self: Request) -> str:
+        """Return the token reservation ID.
+
+        Returns
+        -------
+            str: ID of the token reservation, empty if none.
+
+        """
+        return self.__reservation
+
+    @property
+    def job_id(self: Request) -> str:
+        """Return the job ID.
+
+        Returns
+        -------
+            str: ID of the job, empty if none.
+
+        """
+        return self.__job_id
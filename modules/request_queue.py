@@ -2,7 +2,7 @@
 
 from __future__ import annotations
 
-import time
+import threading
 from typing import TYPE_CHECKING, Callable
 
 if TYPE_CHECKING:
@@ -14,6 +14,9 @@ if TYPE_CHECKING:
 class Queue:
     """Class that implements a request queue.
 
+    The queue is thread-safe: several threads may call `run` to process
+    requests in parallel.
+
     Attributes
     ----------
         timeout (int): Timeout in seconds for the queue's run method.
@@ -44,24 +47,8 @@ class Queue:
         self.__max_length = max_length
         self.__logger = logger
         self.__processing_function = processing_function
-
-    def user_in_queue(self: Queue, user_id: int, request_type: str) -> bool:
-        """Check if a user is already in the queue for a specific request type.
-
-        Args:
-        ----
-            user_id (int): User's id.
-            request_type (str): Request type.
-
-        Returns:
-        -------
-            bool: If the user is in the queue for the specified request type.
-
-        """
-        for item in self.__queue:
-            if item.user_id == user_id and item.request_type == request_type:
-                return True
-        return False
+        self.__stopped = threading.Event()
+        self.__lock = threading.Lock()
 
     def put(self: Queue, item: Request) -> bool:
         """Add a request to the queue.
@@ -71,25 +58,28 @@ class Queue:
             item (Request): Request to be added.
 
         """
-        if len(self.__queue) >= self.__max_length:
-            return False
-
-        self.__queue.append(item)
+        with self.__lock:
+            if len(self.__queue) >= self.__max_length:
+                return False
+            self.__queue.append(item)
         self.__logger.info(
             "Request added to queue.",
             extra={"message_type": item.request_type},
         )
         return True
 
-    def get(self: Queue) -> Request:
+    def get(self: Queue) -> Request | None:
         """Remove and return the oldest request from the queue.
 
         Returns
         -------
-            Request: The oldest request in the queue.
+            Request | None: The oldest request in the queue, None if it is empty.
 
         """
-        item = self.__queue.pop(0)
+        with self.__lock:
+            if not self.__queue:
+                return None
+            item = self.__queue.pop(0)
         self.__logger.info(
             "Request removed from queue.",
             extra={"message_type": item.request_type},
@@ -109,18 +99,23 @@ class Queue:
     def run(self: Queue) -> None:
         """Continuously process the requests in the queue.
 
-        The function will sleep for the queue's timeout between iterations.
+        The function will sleep for the queue's timeout between iterations
+        and return once `stop` is called.
         """
-        while True:
-            if self.__queue:
-                item = self.get()
+        while not self.__stopped.is_set():
+            item = self.get()
+            if item is not None:
                 if self.__processing_function is not None:
                     self.__processing_function(item)
                 self.__logger.info(
                     "Request {item.request_type} processed.",
                     extra={"message_type": "server"},
                 )
-            time.sleep(self.__timeout)
+            self.__stopped.wait(self.__timeout)
+
+    def stop(self: Queue) -> None:
+        """Stop `run` after the request being processed."""
+        self.__stopped.set()
 
     @property
     def processing_function(self: Queue) -> Callable | None:
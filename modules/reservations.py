@@ -0,0 +1,148 @@
+"""Reservations module."""
+
+from __future__ import annotations
+
+import threading
+import uuid
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+    from data.user_database import UserDatabase
+
+
+class TokenReservations:
+    """Holds on user tokens taken before a request is processed.
+
+    A request reserves its price when it is queued. The tokens stay on the
+    balance but can not be reserved again, so concurrent requests can not
+    overspend. The reservation is committed, i.e. debited, when the note is
+    delivered, and released when the request fails.
+
+    Holds are kept in memory: after a restart nothing stays reserved and
+    nothing was debited.
+
+    Attributes
+    ----------
+        database (UserDatabase): Database of the balances.
+
+    """
+
+    def __init__(
+        self: TokenReservations,
+        database: UserDatabase,
+        logger: Logger,
+    ) -> None:
+        """Create a new empty reservation book.
+
+        Args:
+        ----
+            database (UserDatabase): Database of the balances.
+            logger (CustomLogger): Logger instance for logging.
+
+        """
+        self.database = database
+        self.logger = logger
+        # Reserved amount and user ID, by reservation ID
+        self.__holds: dict[str, tuple[int, int]] = {}
+        # Reservations being debited, their holds stay until the debit returns
+        self.__committing: set[str] = set()
+        self.__lock = threading.Lock()
+
+    def held(self: TokenReservations, user_id: int) -> int:
+        """Return the amount of tokens reserved by a user.
+
+        Args:
+        ----
+            user_id (int): The ID of the user.
+
+        Returns:
+        -------
+            int: Reserved tokens.
+
+        """
+        with self.__lock:
+            return self.__held(user_id)
+
+    def reserve(self: TokenReservations, user_id: int, amount: int) -> tuple[int, str]:
+        """Reserve tokens of a user.
+
+        Args:
+        ----
+            user_id (int): The ID of the user.
+            amount (int): The amount of tokens to reserve.
+
+        Returns:
+        -------
+            (int, str): The status code and the reservation ID.
+                Return 403 if the user has not enough free tokens.
+                Return 404 if the user is not found.
+                Return 500 if the balance could not be read.
+
+        """
+        # The balance is read under the lock, so it is never read before
+        # a debit whose hold is already gone
+        with self.__lock:
+            code, user = self.database.get_user(user_id)
+            if code != 200:  # noqa: PLR2004
+                return 500, ""
+            if user is None:
+                return 404, ""
+            if user.tokens - self.__held(user_id) < amount:
+                return 403, ""
+            reservation_id = str(uuid.uuid4())
+            self.__holds[reservation_id] = (user_id, amount)
+
+        return 200, reservation_id
+
+    def commit(self: TokenReservations, reservation_id: str) -> tuple[int, int | None]:
+        """Debit the reserved tokens.
+
+        Args:
+        ----
+            reservation_id (str): The reservation ID.
+
+        Returns:
+        -------
+            (int, Optional[int]): The status code and the new balance.
+                Return 404 if the reservation is unknown or being committed.
+
+        """
+        with self.__lock:
+            hold = self.__holds.get(reservation_id)
+            if hold is None or reservation_id in self.__committing:
+                return 404, None
+            self.__committing.add(reservation_id)
+
+        user_id, amount = hold
+        try:
+            return self.database.decrease_tokens(user_id, amount)
+        finally:
+            with self.__lock:
+                self.__holds.pop(reservation_id, None)
+                self.__committing.discard(reservation_id)
+
+    def release(self: TokenReservations, reservation_id: str) -> None:
+        """Free the reserved tokens without debiting them.
+
+        Args:
+        ----
+            reservation_id (str): The reservation ID.
+
+        """
+        with self.__lock:
+            hold = self.__holds.pop(reservation_id, None)
+        if hold is not None:
+            self.logger.info(
+                "Released %s tokens of user %s.",
+                hold[1],
+                hold[0],
+                extra={"message_type": "server"},
+            )
+
+    def __held(self: TokenReservations, user_id: int) -> int:
+        """Return the amount of tokens reserved by a user, under the lock."""
+        return sum(
+            amount for holder, amount in self.__holds.values() if holder == user_id
+        )
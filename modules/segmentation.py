@@ -0,0 +1,197 @@
+"""Segmentation module.
+
+Splits transcripts into sentence-aligned segments sized in model tokens.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from typing import Callable
+
+# Sentence boundary: terminal punctuation (with closing quotes/brackets)
+# followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…][\"»)\]])\s+|(?<=[.!?…])\s+")
+
+# Average number of characters per model token.
+# Russian text tokenizes denser than English, so the estimate is conservative.
+CHARS_PER_TOKEN = 3.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of model tokens in a text.
+
+    The estimate is a character count heuristic: it does not need
+    a tokenizer and errs on the side of more tokens.
+
+    Args:
+    ----
+        text (str): Text to estimate.
+
+    Returns:
+    -------
+        int: Estimated number of tokens.
+
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def token_budget(
+    context_tokens: int,
+    instruction: str,
+    completion_tokens: int,
+) -> int:
+    """Return the number of tokens left for the transcript in one request.
+
+    Args:
+    ----
+        context_tokens (int): Context size of the model.
+        instruction (str): System prompt sent with every request.
+        completion_tokens (int): Tokens reserved for the model answer.
+
+    Returns:
+    -------
+        int: Token budget of a segment, at least 1.
+
+    """
+    return max(1, context_tokens - estimate_tokens(instruction) - completion_tokens)
+
+
+class TranscriptSegmenter:
+    """Packs whole sentences into segments that fit a token budget.
+
+    Text can be fed incrementally: `feed` returns the segments that are
+    complete, `flush` returns the rest. A sentence longer than the budget
+    is split on word boundaries.
+
+    Attributes
+    ----------
+        max_tokens (int): Token budget of a segment.
+        estimate (Callable[[str], int]): Token estimator.
+
+    """
+
+    def __init__(
+        self: TranscriptSegmenter,
+        max_tokens: int,
+        estimate: Callable[[str], int] = estimate_tokens,
+    ) -> None:
+        """Create a new segmenter.
+
+        Args:
+        ----
+            max_tokens (int): Token budget of a segment.
+            estimate (Callable[[str], int]): Token estimator.
+
+        """
+        self.max_tokens = max_tokens
+        self.estimate = estimate
+        self.__pending = ""
+        self.__sentences: list[str] = []
+        self.__tokens = 0
+
+    def split(self: TranscriptSegmenter, text: str) -> list[str]:
+        """Split a whole text into segments.
+
+        Args:
+        ----
+            text (str): Text to split.
+
+        Returns:
+        -------
+            list[str]: Segments.
+
+        """
+        return self.feed(text) + self.flush()
+
+    def feed(self: TranscriptSegmenter, text: str) -> list[str]:
+        """Add text and return the segments that are complete.
+
+        The trailing unfinished sentence is kept until more text
+        or `flush` arrives. If it outgrows the budget, e.g. for a transcript
+        without punctuation, it is split on word boundaries and only its
+        last words are kept.
+
+        Args:
+        ----
+            text (str): Next piece of the transcript.
+
+        Returns:
+        -------
+            list[str]: Complete segments.
+
+        """
+        parts = SENTENCE_BOUNDARY.split(self.__pending + text)
+        self.__pending = parts.pop()
+
+        segments: list[str] = []
+        for sentence in parts:
+            segments.extend(self.__add(sentence))
+        if self.estimate(self.__pending) > self.max_tokens:
+            segments.extend(self.__split_pending())
+        return segments
+
+    def flush(self: TranscriptSegmenter) -> list[str]:
+        """Return all remaining text as segments and reset the segmenter.
+
+        Returns
+        -------
+            list[str]: Remaining segments.
+
+        """
+        segments = self.__add(self.__pending)
+        self.__pending = ""
+        if self.__sentences:
+            segments.append(self.__emit())
+        return segments
+
+    def __add(self: TranscriptSegmenter, sentence: str) -> list[str]:
+        """Add a sentence to the current segment."""
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            return []
+
+        tokens = self.estimate(sentence + " ")
+        if tokens > self.max_tokens:
+            segments = [self.__emit()] if self.__sentences else []
+            segments.extend(self.__split_words(sentence))
+            return segments
+
+        segments = []
+        if self.__tokens + tokens > self.max_tokens:
+            segments.append(self.__emit())
+        self.__sentences.append(sentence)
+        self.__tokens += tokens
+        return segments
+
+    def __split_pending(self: TranscriptSegmenter) -> list[str]:
+        """Emit an oversized unfinished sentence, keeping its last words pending."""
+        trailing = self.__pending[len(self.__pending.rstrip()) :]
+        pieces = self.__split_words(" ".join(self.__pending.split()))
+        self.__pending = pieces.pop() + trailing
+        segments = [self.__emit()] if self.__sentences else []
+        segments.extend(pieces)
+        return segments
+
+    def __split_words(self: TranscriptSegmenter, sentence: str) -> list[str]:
+        """Split an oversized sentence into word-aligned segments."""
+        segments: list[str] = []
+        words: list[str] = []
+        tokens = 0
+        for word in sentence.split(" "):
+            word_tokens = self.estimate(word + " ")
+            if words and tokens + word_tokens > self.max_tokens:
+                segments.append(" ".join(words))
+                words, tokens = [], 0
+            words.append(word)
+            tokens += word_tokens
+        if words:
+            segments.append(" ".join(words))
+        return segments
+
+    def __emit(self: TranscriptSegmenter) -> str:
+        """Return the current segment and start a new one."""
+        segment = " ".join(self.__sentences)
+        self.__sentences = []
+        self.__tokens = 0
+        return segment
@@ -0,0 +1,493 @@
+"""Summarization module.
+
+Map-reduce summarization of long transcripts.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Callable
+
+from model.text import MODEL, text2note, text2note_async, text2note_streamed
+from modules.cache import content_hash
+from modules.segmentation import estimate_tokens, token_budget
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+    from model.resilience import ResilientCaller
+    from modules.cache import DiskCache
+    from modules.event_loop import EventLoopThread
+    from modules.prompts import Prompt
+
+# Separator between partial notes in a reduce request
+NOTES_SEPARATOR = "\n\n---\n\n"
+
+
+class MapReduceSummarizer:
+    """Summarizes transcript segments concurrently and merges the results.
+
+    The map step sends every segment to the model in parallel.
+    The reduce step packs partial notes into requests that fit the context
+    and merges them; when they do not fit into one request, the notes are
+    merged in several rounds until a single note is left.
+    The request that produces the final note can be streamed.
+    Answers of both steps are cached by (model, instruction hash, text hash),
+    so a changed instruction never hits old entries.
+    With an event loop, requests that are not streamed run on it as
+    coroutines instead of taking a worker thread each.
+
+    Attributes
+    ----------
+        caller (ResilientCaller): Caller used for the model requests.
+        logger (CustomLogger): Logger instance for logging.
+        context_tokens (int): Context size of the model.
+        completion_tokens (int): Tokens reserved for the model answer.
+        cache (DiskCache | None): Cache of the model answers.
+        event_loop (EventLoopThread | None): Loop of the asynchronous requests.
+
+    """
+
+    def __init__(  # noqa: PLR0913
+        self: MapReduceSummarizer,
+        caller: ResilientCaller,
+        logger: Logger,
+        context_tokens: int,
+        completion_tokens: int,
+        max_workers: int = 4,
+        cache: DiskCache | None = None,
+        event_loop: EventLoopThread | None = None,
+    ) -> None:
+        """Create a new summarizer.
+
+        Args:
+        ----
+            caller (ResilientCaller): Caller used for the model requests.
+            logger (CustomLogger): Logger instance for logging.
+            context_tokens (int): Context size of the model.
+            completion_tokens (int): Tokens reserved for the model answer.
+            max_workers (int): Maximum number of concurrent model requests.
+            cache (DiskCache | None): Cache of the model answers.
+            event_loop (EventLoopThread | None): Loop of the asynchronous
+                requests, None to send every request from a worker thread.
+
+        """
+        self.caller = caller
+        self.logger = logger
+        self.context_tokens = context_tokens
+        self.completion_tokens = completion_tokens
+        self.cache = cache
+        self.event_loop = event_loop
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="summarizer",
+        )
+
+    def session(
+        self: MapReduceSummarizer,
+        oauth_token: str,
+        instruction: Prompt,
+        reduce_instruction: Prompt,
+    ) -> SummarizationSession:
+        """Start a summarization that receives segments one by one.
+
+        Args:
+        ----
+            oauth_token (str): GigaChat OAuth token.
+            instruction (Prompt): Prompt of the map step.
+            reduce_instruction (Prompt): Prompt of the reduce step.
+
+        Returns:
+        -------
+            SummarizationSession: The new session.
+
+        """
+        return SummarizationSession(self, oauth_token, instruction, reduce_instruction)
+
+    def summarize(  # noqa: PLR0913
+        self: MapReduceSummarizer,
+        oauth_token: str,
+        segments: list[str],
+        instruction: Prompt,
+        reduce_instruction: Prompt,
+        on_text: Callable[[str], None] | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
+    ) -> tuple[int, str]:
+        """Summarize segments into one note.
+
+        Args:
+        ----
+            oauth_token (str): GigaChat OAuth token.
+            segments (list[str]): Transcript segments.
+            instruction (Prompt): Prompt of the map step.
+            reduce_instruction (Prompt): Prompt of the reduce step.
+            on_text (Callable[[str], None] | None): Called with the final note
+                received so far while it streams.
+            on_progress (Callable[[int, int], None] | None): Called with the
+                finished and total segments of the map step.
+
+        Returns:
+        -------
+            tuple[int, str]: Status code and the note.
+
+        """
+        return self.session(oauth_token, instruction, reduce_instruction).finish(
+            segments,
+            on_text,
+            on_progress,
+        )
+
+    def submit(
+        self: MapReduceSummarizer,
+        oauth_token: str,
+        instruction: Prompt,
+        text: str,
+    ) -> Future:
+        """Schedule one summarization request.
+
+        Args:
+        ----
+            oauth_token (str): GigaChat OAuth token.
+            instruction (Prompt): System prompt.
+            text (str): User message.
+
+        Returns:
+        -------
+            Future: Future of the status code and the model answer.
+
+        """
+        return self.__schedule(oauth_token, instruction, text)
+
+    def reduce(
+        self: MapReduceSummarizer,
+        oauth_token: str,
+        notes: list[str],
+        reduce_instruction: Prompt,
+        on_text: Callable[[str], None] | None = None,
+    ) -> tuple[int, str]:
+        """Merge partial notes into one note.
+
+        Args:
+        ----
+            oauth_token (str): GigaChat OAuth token.
+            notes (list[str]): Partial notes.
+            reduce_instruction (Prompt): Prompt of the reduce step.
+            on_text (Callable[[str], None] | None): Called with the final note
+                received so far while it streams.
+
+        Returns:
+        -------
+            tuple[int, str]: Status code and the note.
+
+        """
+        budget = token_budget(
+            self.context_tokens,
+            reduce_instruction.text,
+            self.completion_tokens,
+        )
+
+        while len(notes) > 1:
+            groups = self.group(notes, budget)
+            if len(groups) == len(notes):
+                # Not even two notes fit into one request
+                self.logger.info(
+                    "Notes are too long to merge.",
+                    extra={"message_type": "text2note"},
+                )
+                break
+
+            # The last round produces the final note: stream it
+            final_on_text = on_text if len(groups) == 1 else None
+            futures = [
+                self.__schedule(
+                    oauth_token,
+                    reduce_instruction,
+                    NOTES_SEPARATOR.join(group),
+                    final_on_text,
+                )
+                if len(group) > 1
+                else None
+                for group in groups
+            ]
+
+            merged = []
+            for group, future in zip(groups, futures, strict=True):
+                if future is None:
+                    merged.append(group[0])
+                    continue
+                code, note = future.result()
+                if code != 200:  # noqa: PLR2004
+                    return code, ""
+                merged.append(note)
+
+            self.logger.info(
+                "Reduce round done: %s -> %s notes.",
+                len(notes),
+                len(merged),
+                extra={"message_type": "text2note"},
+            )
+            notes = merged
+
+        return 200, NOTES_SEPARATOR.join(notes)
+
+    def complete(
+        self: MapReduceSummarizer,
+        oauth_token: str,
+        instruction: Prompt,
+        text: str,
+        on_text: Callable[[str], None] | None = None,
+    ) -> tuple[int, str]:
+        """Send one summarization request.
+
+        Args:
+        ----
+            oauth_token (str): GigaChat OAuth token.
+            instruction (Prompt): System prompt.
+            text (str): User message.
+            on_text (Callable[[str], None] | None): If set, the answer is streamed
+                and the callback gets the answer received so far.
+
+        Returns:
+        -------
+            tuple[int, str]: Status code and the model answer.
+
+        """
+        key = f"{MODEL}-{instruction.digest}-{content_hash(text)}"
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            note = cached.decode()
+            if on_text is not None:
+                on_text(note)
+            return 200, note
+
+        if on_text is None:
+            code, note = self.caller.call(
+                text2note,
+                oauth_token,
+                instruction.text,
+                self.logger,
+                text,
+                payload_size=len(instruction.text) + len(text),
+            )
+        else:
+            code, note = self.caller.call(
+                text2note_streamed,
+                oauth_token,
+                instruction.text,
+                self.logger,
+                text,
+                on_text,
+                payload_size=len(instruction.text) + len(text),
+                # A second stream would be paid for and written to the same callback
+                hedge=False,
+            )
+
+        if code == 200 and self.cache is not None:  # noqa: PLR2004
+            self.cache.put(key, note.encode())
+        return code, note
+
+    async def acomplete(
+        self: MapReduceSummarizer,
+        oauth_token: str,
+        instruction: Prompt,
+        text: str,
+    ) -> tuple[int, str]:
+        """Send one summarization request from the event loop.
+
+        Args:
+        ----
+            oauth_token (str): GigaChat OAuth token.
+            instruction (Prompt): System prompt.
+            text (str): User message.
+
+        Returns:
+        -------
+            tuple[int, str]: Status code and the model answer.
+
+        """
+        event_loop: EventLoopThread = self.event_loop  # type: ignore[assignment]
+        key = f"{MODEL}-{instruction.digest}-{content_hash(text)}"
+        cached = (
+            await event_loop.offload(self.cache.get, key)
+            if self.cache is not None
+            else None
+        )
+        if cached is not None:
+            return 200, cached.decode()
+
+        code, note = await self.caller.acall(
+            text2note_async,
+            event_loop.client,
+            oauth_token,
+            instruction.text,
+            self.logger,
+            text,
+            payload_size=len(instruction.text) + len(text),
+        )
+
+        if code == 200 and self.cache is not None:  # noqa: PLR2004
+            await event_loop.offload(self.cache.put, key, note.encode())
+        return code, note
+
+    def __schedule(
+        self: MapReduceSummarizer,
+        oauth_token: str,
+        instruction: Prompt,
+        text: str,
+        on_text: Callable[[str], None] | None = None,
+    ) -> Future:
+        """Schedule one request on the event loop, or on a worker if streamed."""
+        if self.event_loop is not None and on_text is None:
+            return self.event_loop.submit(
+                self.acomplete(oauth_token, instruction, text),
+            )
+        return self.__executor.submit(
+            self.complete,
+            oauth_token,
+            instruction,
+            text,
+            on_text,
+        )
+
+    @staticmethod
+    def group(notes: list[str], budget: int) -> list[list[str]]:
+        """Pack consecutive notes into groups that fit the token budget.
+
+        Args:
+        ----
+            notes (list[str]): Notes in document order.
+            budget (int): Token budget of a group.
+
+        Returns:
+        -------
+            list[list[str]]: Groups of notes.
+
+        """
+        separator_tokens = estimate_tokens(NOTES_SEPARATOR)
+        groups: list[list[str]] = []
+        tokens = 0
+        for note in notes:
+            note_tokens = estimate_tokens(note) + separator_tokens
+            if groups and tokens + note_tokens <= budget:
+                groups[-1].append(note)
+                tokens += note_tokens
+            else:
+                groups.append([note])
+                tokens = note_tokens
+        return groups
+
+
+class SummarizationSession:
+    """Map-reduce summarization that receives segments one by one.
+
+    Every added segment is sent to the model right away, so the map step
+    can run while the rest of the transcript is still being produced.
+    `finish` waits for the map step and runs the reduce step.
+
+    Attributes
+    ----------
+        oauth_token (str): GigaChat OAuth token, can be refreshed before `finish`.
+        instruction (Prompt): Prompt of the map step.
+        reduce_instruction (Prompt): Prompt of the reduce step.
+
+    """
+
+    def __init__(
+        self: SummarizationSession,
+        summarizer: MapReduceSummarizer,
+        oauth_token: str,
+        instruction: Prompt,
+        reduce_instruction: Prompt,
+    ) -> None:
+        """Create a new session.
+
+        Args:
+        ----
+            summarizer (MapReduceSummarizer): Summarizer that runs the requests.
+            oauth_token (str): GigaChat OAuth token.
+            instruction (Prompt): Prompt of the map step.
+            reduce_instruction (Prompt): Prompt of the reduce step.
+
+        """
+        self.oauth_token = oauth_token
+        self.instruction = instruction
+        self.reduce_instruction = reduce_instruction
+        self.__summarizer = summarizer
+        self.__futures: list[Future] = []
+
+    def add_segment(self: SummarizationSession, segment: str) -> None:
+        """Start summarizing a segment.
+
+        Args:
+        ----
+            segment (str): Next transcript segment.
+
+        """
+        self.__futures.append(
+            self.__summarizer.submit(self.oauth_token, self.instruction, segment),
+        )
+
+    def finish(
+        self: SummarizationSession,
+        segments: list[str] | None = None,
+        on_text: Callable[[str], None] | None = None,
+        on_progress: Callable[[int, int], None] | None = None,
+    ) -> tuple[int, str]:
+        """Summarize the last segments and merge all partial notes.
+
+        Args:
+        ----
+            segments (list[str] | None): Segments that were not added yet.
+            on_text (Callable[[str], None] | None): Called with the final note
+                received so far while it streams.
+            on_progress (Callable[[int, int], None] | None): Called with the
+                finished and total segments of the map step.
+
+        Returns:
+        -------
+            tuple[int, str]: Status code and the note.
+
+        """
+        segments = segments or []
+
+        # A single segment is the final note: stream it
+        if not self.__futures and len(segments) == 1:
+            return self.__summarizer.complete(
+                self.oauth_token,
+                self.instruction,
+                segments[0],
+                on_text,
+            )
+
+        for segment in segments:
+            self.add_segment(segment)
+
+        if on_progress is not None:
+            for done, _ in enumerate(as_completed(self.__futures), start=1):
+                on_progress(done, len(self.__futures))
+
+        results = [future.result() for future in self.__futures]
+        for code, _ in results:
+            if code != 200:  # noqa: PLR2004
+                return code, ""
+
+        notes = [note for _, note in results]
+        self.__summarizer.logger.info(
+            "Map step done: %s notes.",
+            len(notes),
+            extra={"message_type": "text2note"},
+        )
+        if len(notes) == 1 and on_text is not None:
+            on_text(notes[0])
+
+        return self.__summarizer.reduce(
+            self.oauth_token,
+            notes,
+            self.reduce_instruction,
+            on_text,
+        )
+
+    def cancel(self: SummarizationSession) -> None:
+        """Cancel the requests that have not started yet."""
+        for future in self.__futures:
+            future.cancel()
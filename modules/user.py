@@ -83,6 +83,20 @@ class User:
         """
         return datetime.strftime(self.__created_at, "%Y-%m-%d %H:%M:%S")
 
+    def with_tokens(self: User, tokens: int) -> User:
+        """Return a copy of the user with another number of tokens.
+
+        Args:
+        ----
+            tokens (int): number of tokens
+
+        Returns:
+        -------
+            User: user with the new balance
+
+        """
+        return User(self.id, self.name, tokens, self.__created_at.isoformat())
+
     def get_data(self: User) -> dict:
         """User data.
 
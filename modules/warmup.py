@@ -0,0 +1,58 @@
+"""Warm-up module.
+
+Loads slow dependencies in the background once the bot is answering.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+
+def warm_up(
+    tasks: dict[str, Callable[[], object]],
+    logger: Logger,
+) -> threading.Thread:
+    """Run warm-up tasks one by one in a daemon thread.
+
+    A failed task is only logged: the dependency is loaded again on first
+    use and reports its error there.
+
+    Args:
+    ----
+        tasks (dict[str, Callable[[], object]]): Warm-up functions by name.
+        logger (CustomLogger): Logger instance for logging.
+
+    Returns:
+    -------
+        threading.Thread: The started thread.
+
+    """
+
+    def run() -> None:
+        for name, task in tasks.items():
+            start = time.perf_counter()
+            try:
+                task()
+            except Exception as e:  # noqa: BLE001
+                logger.info(
+                    "Warm-up of %s failed: %s",
+                    name,
+                    e,
+                    extra={"message_type": "server"},
+                )
+                continue
+            logger.info(
+                "Warm-up of %s took %.2f s.",
+                name,
+                time.perf_counter() - start,
+                extra={"message_type": "server"},
+            )
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,200 @@
+"""Webhook module.
+
+HTTP server that receives Telegram updates instead of long polling.
+"""
+
+from __future__ import annotations
+
+import hmac
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING
+
+import telebot  # type: ignore[import-untyped]
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+# Header with the secret token set by `setWebhook`
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"  # noqa: S105
+
+# Maximum size of an update body in bytes
+MAX_UPDATE_BYTES = 1024 * 1024
+
+
+class WebhookServer:
+    """Receives Telegram updates over HTTP and handles them in a thread pool.
+
+    Every POST to `path` with the right secret token is answered at once,
+    the update is handled by the bot in one of `workers` threads.
+    Requests without the token are refused with 403, so updates such as
+    payments can not be forged by anyone who knows the URL.
+    `stop` drains the server: new updates are refused with 503, so Telegram
+    delivers them again later, and updates already accepted are finished.
+
+    Attributes
+    ----------
+        bot (telebot.TeleBot): The Telegram bot instance.
+        host (str): Address to listen on.
+        port (int): Port to listen on.
+        path (str): URL path of the webhook.
+        workers (int): Number of handler threads.
+
+    """
+
+    def __init__(  # type: ignore[no-any-unimported]  # noqa: PLR0913
+        self: WebhookServer,
+        bot: telebot.TeleBot,
+        logger: Logger,
+        host: str = "0.0.0.0",  # noqa: S104
+        port: int = 8443,
+        path: str = "/telegram",
+        secret_token: str = "",
+        workers: int = 8,
+    ) -> None:
+        """Create a new server, it is started with `start`.
+
+        Args:
+        ----
+            bot (telebot.TeleBot): The Telegram bot instance.
+            logger (CustomLogger): Logger instance for logging.
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 for any free port.
+            path (str): URL path of the webhook.
+            secret_token (str): Token expected in the secret token header.
+            workers (int): Number of handler threads.
+
+        Raises:
+        ------
+            ValueError: If the secret token is empty.
+
+        """
+        if not secret_token:
+            msg = "Webhook secret token is required."
+            raise ValueError(msg)
+
+        self.bot = bot
+        self.logger = logger
+        self.path = path
+        self.workers = workers
+        self.__secret_token = secret_token
+        self.__draining = threading.Event()
+        self.__handlers = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="webhook",
+        )
+        self.__server = ThreadingHTTPServer((host, port), self.__request_handler())
+        self.__server.daemon_threads = True
+        self.host, self.port = self.__server.server_address[:2]
+        self.__thread: threading.Thread | None = None
+
+    def start(self: WebhookServer) -> None:
+        """Start serving in a background thread."""
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever,
+            name="webhook-server",
+        )
+        self.__thread.start()
+        self.logger.info(
+            "Webhook server listening on %s:%s%s.",
+            self.host,
+            self.port,
+            self.path,
+            extra={"message_type": "server"},
+        )
+
+    def stop(self: WebhookServer) -> None:
+        """Refuse new updates, finish the accepted ones and stop the server."""
+        self.__draining.set()
+        self.__handlers.shutdown(wait=True)
+        self.__server.shutdown()
+        self.__server.server_close()
+        if self.__thread is not None:
+            self.__thread.join()
+        self.logger.info("Webhook server stopped.", extra={"message_type": "server"})
+
+    def accept(self: WebhookServer, body: bytes, secret_token: str | None) -> int:
+        """Validate an update and schedule its handling.
+
+        Args:
+        ----
+            body (bytes): JSON body of the request.
+            secret_token (str | None): Value of the secret token header.
+
+        Returns:
+        -------
+            int: HTTP status code of the response.
+
+        """
+        if not hmac.compare_digest(
+            (secret_token or "").encode(),
+            self.__secret_token.encode(),
+        ):
+            return HTTPStatus.FORBIDDEN
+        if self.__draining.is_set():
+            return HTTPStatus.SERVICE_UNAVAILABLE
+
+        try:
+            update = telebot.types.Update.de_json(json.loads(body))
+        except (ValueError, TypeError, KeyError):
+            return HTTPStatus.BAD_REQUEST
+        if update is None:
+            # e.g. a body of `null`
+            return HTTPStatus.BAD_REQUEST
+
+        try:
+            self.__handlers.submit(self.__handle, update)
+        except RuntimeError:
+            # The pool was shut down between the check and the submit
+            return HTTPStatus.SERVICE_UNAVAILABLE
+        return HTTPStatus.OK
+
+    def __handle(self: WebhookServer, update: telebot.types.Update) -> None:  # type: ignore[no-any-unimported]
+        """Handle one update with the bot's handlers."""
+        try:
+            self.bot.process_new_updates([update])
+        except Exception:
+            self.logger.exception(
+                "Error handling update.",
+                extra={"message_type": "server"},
+            )
+
+    def __request_handler(self: WebhookServer) -> type[BaseHTTPRequestHandler]:
+        """Create the request handler class bound to this server."""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self: Handler) -> None:
+                if self.path != server.path:
+                    self.__respond(HTTPStatus.NOT_FOUND)
+                    return
+
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    self.__respond(HTTPStatus.BAD_REQUEST)
+                    return
+                if length < 0:
+                    self.__respond(HTTPStatus.BAD_REQUEST)
+                    return
+                if length > MAX_UPDATE_BYTES:
+                    self.__respond(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                    return
+
+                body = self.rfile.read(length)
+                self.__respond(
+                    server.accept(body, self.headers.get(SECRET_TOKEN_HEADER)),
+                )
+
+            def log_message(self: Handler, *_: object) -> None:
+                """Skip access logs, there is one request per update."""
+
+            def __respond(self: Handler, status: int) -> None:
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        return Handler
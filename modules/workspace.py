@@ -0,0 +1,130 @@
+"""Workspace module.
+
+Scratch directories of the jobs.
+"""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from logging import Logger
+
+# Directory with the workspaces of all jobs
+WORKSPACES_ROOT = "data/jobs"
+
+
+class Workspace:
+    """Scratch directory of one job.
+
+    A job keeps its audio, chunks and transcript in its own directory,
+    so several jobs of one user can run at once without overwriting
+    each other's files. The directory is removed with `cleanup` when
+    the job ends.
+
+    Attributes
+    ----------
+        job_id (str): ID of the job.
+        path (Path): The directory of the job.
+
+    """
+
+    def __init__(self: Workspace, job_id: str, root: str = WORKSPACES_ROOT) -> None:
+        """Create a workspace, the directory is made with `create`.
+
+        Args:
+        ----
+            job_id (str): ID of the job.
+            root (str): Directory with the workspaces of all jobs.
+
+        """
+        self.job_id = job_id
+        self.path = Path(root) / job_id
+
+    def audio(self: Workspace, name: str) -> Path:
+        """Return the path of a downloaded audio file.
+
+        Args:
+        ----
+            name (str): Name of the file in the workspace.
+
+        Returns:
+        -------
+            Path: Path to the file.
+
+        """
+        return self.path / name
+
+    @property
+    def chunks(self: Workspace) -> Path:
+        """Return the directory of the audio chunks.
+
+        Returns
+        -------
+            Path: The directory of the chunks.
+
+        """
+        return self.path / "chunks"
+
+    @property
+    def text(self: Workspace) -> Path:
+        """Return the path of the transcript.
+
+        Returns
+        -------
+            Path: Path to the transcript.
+
+        """
+        return self.path / "text.txt"
+
+    def create(self: Workspace) -> Workspace:
+        """Make the directory if it does not exist.
+
+        Returns
+        -------
+            Workspace: The workspace itself.
+
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def cleanup(self: Workspace) -> None:
+        """Remove the directory with all files of the job."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def remove_workspaces(logger: Logger, root: str = WORKSPACES_ROOT) -> int:
+    """Remove the workspaces of all jobs.
+
+    Called at startup: the queue is kept in memory, so jobs of the previous
+    run can not continue and all their workspaces are orphaned.
+
+    Args:
+    ----
+        logger (CustomLogger): Logger instance for logging.
+        root (str): Directory with the workspaces of all jobs.
+
+    Returns:
+    -------
+        int: Number of removed workspaces.
+
+    """
+    root_path = Path(root)
+    if not root_path.exists():
+        return 0
+
+    removed = 0
+    for path in root_path.iterdir():
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+
+    if removed:
+        logger.info(
+            "Removed %s workspaces of interrupted jobs.",
+            removed,
+            extra={"message_type": "server"},
+        )
+    return removed
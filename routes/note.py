@@ -5,30 +5,56 @@ Handles voice messages and processes requests.
 
 from __future__ import annotations
 
-import os
+import asyncio
+import io
 import shutil
+import time
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-import md2pdf  # type: ignore[import-untyped]
+import telebot  # type: ignore[import-untyped]
 
 from model.oauth import get_token
-from model.speech import speech2text
-from model.text import text2note
+from model.resilience import ResilientCaller
+from model.speech import speech2text, speech2text_async
+from model.timeouts import TimeoutPolicy
+from modules.artifacts import Artifacts
 from modules.audio_pocessing import AudioProcessing
+from modules.cache import content_hash
+from modules.latency import LatencyRecorder
+from modules.live_message import LiveMessage
+from modules.progress import ProgressTracker
+from modules.rendering import EmptyMarkdownError
 from modules.request import Request
+from modules.segmentation import TranscriptSegmenter, token_budget
+from modules.summarization import MapReduceSummarizer, SummarizationSession
+from modules.workspace import Workspace
 
 if TYPE_CHECKING:
     from logging import Logger
 
-    import telebot  # type: ignore[import-untyped]
-
     from data.user_database import UserDatabase
+    from modules.artifacts import ArtifactIndex
+    from modules.cache import DiskCache
+    from modules.event_loop import EventLoopThread
+    from modules.outbox import Outbox
+    from modules.prompts import Prompt, PromptRegistry
+    from modules.rendering import PdfRenderer
     from modules.request_queue import Queue
+    from modules.reservations import TokenReservations
     from modules.user import User
 
 
+# Reply to audio longer than the longest priced duration
+AUDIO_TOO_LONG = (
+    "K сожалению, аудио слишком длинное.\n"
+    "Длина записи должна быть не больше часа.\n"
+    "Главное меню /start"
+)
+
+
 class MainRoute:
     """Class for handling voice messages and processing requests."""
 
@@ -41,6 +67,23 @@ class MainRoute:
         user_database: UserDatabase,
         logger: Logger,
         request_queue: Queue,
+        prompts: PromptRegistry,
+        renderer: PdfRenderer,
+        reservations: TokenReservations,
+        outbox: Outbox,
+        model_retries: int = 3,
+        hedge_after: float | None = None,
+        context_tokens: int = 8192,
+        completion_tokens: int = 2048,
+        summary_workers: int = 4,
+        stream_notes: bool = True,  # noqa: FBT001, FBT002
+        incremental_notes: bool = False,  # noqa: FBT001, FBT002
+        transcript_cache: DiskCache | None = None,
+        note_cache: DiskCache | None = None,
+        artifacts: ArtifactIndex | None = None,
+        event_loop: EventLoopThread | None = None,
+        stt_concurrency: int = 4,
+        intake_workers: int = 4,
     ) -> None:
         """Create MainRoute."""
         self.bot = bot
@@ -49,15 +92,70 @@ class MainRoute:
         self.s2t_auth_data = s2t_auth_data
         self.t2n_auth_data = t2n_auth_data
         self.request_queue = request_queue
+        self.prompts = prompts
+        self.renderer = renderer
+        self.reservations = reservations
+        # Messages about requests are sent through the rate-limited outbox
+        self.outbox = outbox
+        self.__delivery = ThreadPoolExecutor(thread_name_prefix="delivery")
+        # Downloads and probes of new messages, off the handler threads
+        self.__intake = ThreadPoolExecutor(
+            max_workers=intake_workers,
+            thread_name_prefix="intake",
+        )
+        self.handler_latency = LatencyRecorder("note", logger)
+        self.context_tokens = context_tokens
+        self.completion_tokens = completion_tokens
+        self.stream_notes = stream_notes
+        self.incremental_notes = incremental_notes
+        self.transcript_cache = transcript_cache
+        self.artifacts = artifacts
+        # Model calls run as coroutines on this loop when it is set
+        self.event_loop = event_loop
+        self.stt_concurrency = stt_concurrency
+        # Summarizations started during speech to text, by job ID
+        self.__sessions: dict[
+            str,
+            tuple[SummarizationSession, TranscriptSegmenter],
+        ] = {}
+        # Progress messages of the jobs, by job ID
+        self.__progress: dict[str, ProgressTracker] = {}
         self.audio_pocessing = AudioProcessing(
             splt_timeout=split_timeout,
             logger=logger,
         )
+        self.speech_caller = ResilientCaller(
+            name="speech2text",
+            logger=logger,
+            retries=model_retries,
+            hedge_after=hedge_after,
+            # Payload size is the chunk size in bytes
+            timeout_policy=TimeoutPolicy(overhead=2.0, per_unit=1e-5),
+        )
+        self.text_caller = ResilientCaller(
+            name="text2note",
+            logger=logger,
+            retries=model_retries,
+            hedge_after=hedge_after,
+            # Payload size is the prompt length in characters
+            timeout_policy=TimeoutPolicy(overhead=5.0, per_unit=0.01),
+        )
+        self.summarizer = MapReduceSummarizer(
+            caller=self.text_caller,
+            logger=logger,
+            context_tokens=context_tokens,
+            completion_tokens=completion_tokens,
+            max_workers=summary_workers,
+            cache=note_cache,
+            event_loop=event_loop,
+        )
 
         @bot.message_handler(content_types=["voice", "audio", "document"])
         def note(message: telebot.types.Message) -> None:  # type: ignore[no-any-unimported]
             """Voice messages and sends them to the queue."""
+            started = time.perf_counter()
             self.__note(message)
+            self.handler_latency.observe(time.perf_counter() - started)
 
         self.logger.info("Main route initialized.", extra={"message_type": "server"})
 
@@ -80,47 +178,83 @@ class MainRoute:
             return -1
         return 50
 
-    @staticmethod
-    def split_string(string: str, length: int) -> list[str]:
-        """Split string.
+    def __note(self: MainRoute, message: telebot.types.Message) -> int:  # type: ignore[no-any-unimported]
+        """Validate an audio message and hand it to the intake pool.
 
-        Args:
-        ----
-            string (str): input string
-            length (int): length of the substring
-
-        Returns:
-        -------
-            list[str]: list of substrings
+        Only the message metadata is read here. Documents are downloaded
+        and probed, and the price is reserved, in the intake pool, so a large
+        upload does not hold the handler thread.
 
+        Return 200 if the message is accepted.
+        Return 403 if audio is too long.
         """
-        result = []
-        for i in range(0, len(string), length):
-            result.append(string[i : i + length])  # noqa: PERF401
-        return result
+        media = message.voice or message.audio
+        if media is not None and self.__get_price(media.duration // 60) == -1:
+            self.outbox.send_message(message.chat.id, AUDIO_TOO_LONG)
+            return 403
 
-    def __note(self: MainRoute, message: telebot.types.Message) -> int:  # type: ignore[no-any-unimported]
+        self.__intake.submit(self.__admit_safely, message)
+        return 200
+
+    def __admit_safely(self: MainRoute, message: telebot.types.Message) -> None:  # type: ignore[no-any-unimported]
+        """Admit a message as a new job, reporting unexpected errors."""
+        job_id = uuid.uuid4().hex
+        try:
+            self.__admit(message, job_id)
+        except Exception:
+            self.logger.exception(
+                "Error admitting audio message.",
+                extra={"message_type": "server"},
+            )
+            self.__finish(
+                job_id,
+                message.chat.id,
+                "Произошла ошибка. Попробуйте еще раз.",
+            )
+
+    def __admit(  # type: ignore[no-any-unimported]
+        self: MainRoute,
+        message: telebot.types.Message,
+        job_id: str,
+    ) -> int:
         """Process audio in chat and send request to the queue.
 
+        Every message is a separate job, so a user can queue several
+        recordings. The price is reserved before the request is queued,
+        so requests that can not be paid for never reach the queue.
+
         Return 200 if successful.
         Return 500 if error.
-        Return 404 if user not found or user already in queue or queue is full.
+        Return 403 if audio is too long or user has not enough tokens.
+        Return 404 if user not found or queue is full.
         """
         user_id = message.chat.id
+        tracker = self.__tracker(job_id, user_id)
+
+        # Same file was already processed: deliver without downloading
+        media = message.voice or message.audio or message.document
+        artifacts = (
+            self.artifacts.get(media.file_unique_id, self.__note_prompts("default"))
+            if self.artifacts is not None and media is not None
+            else None
+        )
+        if artifacts is not None:
+            return self.__deliver_artifacts(job_id, user_id, artifacts)
 
         # get message data
         if message.voice is not None:
             audio_message = message.voice
-            file_name = str(message.chat.id) + ".ogg"
+            file_name = "audio.ogg"
             duration = audio_message.duration // 60
             file_id = audio_message.file_id
         elif message.audio is not None:
             audio_message = message.audio
-            file_name = str(message.chat.id) + Path(audio_message.file_name).suffix
+            file_name = "audio" + Path(audio_message.file_name).suffix
             duration = audio_message.duration // 60
             file_id = audio_message.file_id
         elif message.document is not None:
-            file_name = str(message.chat.id) + Path(message.document.file_name).suffix
+            tracker.stage("проверка файла")
+            file_name = "audio" + Path(message.document.file_name).suffix
             file_info = self.bot.get_file(message.document.file_id)
             file_data = self.bot.download_file(file_info.file_path)
 
@@ -128,8 +262,9 @@ class MainRoute:
             file_id = message.document.file_id
 
         if duration is None:
-            self.bot.send_message(
-                message.chat.id,
+            self.__finish(
+                job_id,
+                user_id,
                 "Извини, но я не понимаю, что делать c этим сообщением.\n"
                 "Возможно, формат этого сообщения пока не поддерживается.\n"
                 "Главное меню: /start",
@@ -140,12 +275,21 @@ class MainRoute:
             )
             return 500
 
+        price = self.__get_price(duration)
+        if price == -1:
+            self.__finish(job_id, user_id, AUDIO_TOO_LONG)
+            return 403
+
         # get queue length
         queue_len = len(self.request_queue)
 
         # waiting time
-        time = queue_len * self.request_queue.timeout * queue_len // 60
-        str_time = "<1 минуты" if time == 0 else f"{time} минут"
+        wait_minutes = queue_len * self.request_queue.timeout * queue_len // 60
+        str_time = "<1 минуты" if wait_minutes == 0 else f"{wait_minutes} минут"
+
+        code, reservation = self.__reserve(job_id, user_id, price)
+        if code != 200:  # noqa: PLR2004
+            return code
 
         to_text_request = Request(
             request_type="to_text",
@@ -153,33 +297,53 @@ class MainRoute:
             file_name=file_name,
             user_id=message.from_user.id,
             duration=duration,
+            file_unique_id=media.file_unique_id,
+            reservation=reservation,
+            job_id=job_id,
         )
 
-        if (
-            self.request_queue.user_in_queue(user_id, "to_text")
-            or Path(f"data/chunks/{user_id}").exists()
-        ):
-            self.bot.send_message(
-                user_id,
-                "Извините, вы уже в очереди.\nПoжaлyйcтa, подождите.\nГлaвнoe меню /start",  # noqa: E501
-            )
-            self.logger.info("User already in queue.", extra={"message_type": "server"})
-            return 404
+        # The progress message is the only message until the note is sent
+        tracker.stage("в очереди", f"Пpимepнoe время ожидания: {str_time}")
 
         code = self.request_queue.put(to_text_request)
         if not code:
-            self.bot.send_message(
+            self.reservations.release(reservation)
+            self.__finish(
+                job_id,
                 user_id,
                 "Извините, очередь переполнена.\nПoжaлyйcтa, подождите.\nГлaвнoe меню /start",  # noqa: E501
             )
             self.logger.info("Queue is full.", extra={"message_type": "server"})
             return 404
 
-        self.bot.send_message(
-            user_id,
-            f"Вы добавлены в очередь. Запрос обрабатывается. Пожалуйста, подождите.\nПpимepнoe время ожидания: {str_time}",  # noqa: E501
-        )
+        return 200
+
+    def __deliver_artifacts(
+        self: MainRoute,
+        job_id: str,
+        user_id: int,
+        artifacts: Artifacts,
+    ) -> int:
+        """Send an already made note and charge for it.
+
+        Return 200 if successful.
+        Return 403 if user has not enough tokens.
+        Return 404 if user not found.
+        Return 500 if the balance could not be read or the note was not sent.
+        """
+        price = self.__get_price(artifacts.duration)
+        code, reservation = self.__reserve(job_id, user_id, price)
+        if code != 200:  # noqa: PLR2004
+            return code
+
+        if not self.__send_note(user_id, artifacts.markdown, artifacts.pdf):
+            self.reservations.release(reservation)
+            self.__finish(job_id, user_id, "Произошла ошибка. Попробуйте еще раз.")
+            return 500
 
+        report = self.__charge(reservation, user_id, price)
+        self.__finish(job_id, user_id, f"Конспект готов.\n{report}")
+        self.logger.info("Note sent from artifacts.", extra={"message_type": "server"})
         return 200
 
     def process_request(self: MainRoute, request: Request) -> int:  # type: ignore[no-any-unimported]
@@ -188,14 +352,13 @@ class MainRoute:
         This method checks if the user with the specified ID exists in the database.
         If the user does not exist, the method sends an error message to the user and returns 404.
 
-        If the user exists, the method checks if the user has enough tokens to make the request.
-        If the user does not have enough tokens, the method sends an error message to the user and returns 403.
-
-        If the user has enough tokens, the method processes the request. If an error occurs during
-        the processing, the method sends an error message to the user and returns 500.
+        If the user exists, the method processes the request. The price was reserved when
+        the request was queued. If an error occurs or an exception is raised during the
+        processing, the method sends an error message to the user, releases the reservation,
+        ends the job and returns 500.
 
-        If the request is successful, the method sends the document to the user and updates the user's tokens.
-        The method then returns 200.
+        If the request is successful, the note is rendered and sent to the user in the background,
+        and the reservation is committed after delivery. The method then returns 200.
 
         Args:
         ----
@@ -209,178 +372,545 @@ class MainRoute:
         code, user = self.database.get_user(request.user_id)
 
         ok_code = 200
-        tokens_error = 403
         server_error = 500
 
-        price = self.__get_price(request.duration)
-        if price == -1:
-            self.bot.send_message(
-                request.user_id,
-                "K сожалению, аудио слишком длинное.\n"
-                "Длина записи должна быть не больше часа.\n"
-                "Главное меню /start",
-            )
-            return 403
-
         if code != ok_code:
-            self.bot.send_message(
+            self.reservations.release(request.reservation)
+            self.__finish(
+                request.job_id,
                 request.user_id,
                 "Произошла ошибка. Попробуйте еще раз.",
             )
             return 500
 
         if user is None:
+            self.reservations.release(request.reservation)
             self.logger.info("User not found.", extra={"message_type": "server"})
-            self.bot.send_message(
+            self.__finish(
+                request.job_id,
                 request.user_id,
                 "Произошла ошибка. Попробуйте еще раз.",
             )
             return 404
 
-        if request.request_type == "to_text":
-            code, req = self.__to_text(request, user)
-        else:
-            try:
-                code, result_path = self.__to_note(request, user)
-            except md2pdf.exceptions.ValidationError:
-                self.bot.send_message(
-                    request.user_id,
-                    "Произошла ошибка.\n"
-                    "Возможно, данная запись не содержит ценной информации.\n"
-                    "Главное меню /start",
-                )
-                return 404
-
-        if code == tokens_error:
-            self.bot.send_message(
-                request.user_id,
-                "Недостаточно средств.\nKyпить токены можно в меню /tokens",
-            )
-            self.logger.info(
-                "Not enough tokens. User ID",
+        # An exception must not stop the queue worker or leak the job
+        try:
+            if request.request_type == "to_text":
+                code, req = self.__to_text(request)
+            else:
+                code, _ = self.__to_note(request, user)
+        except Exception:
+            self.logger.exception(
+                "Error processing %s request.",
+                request.request_type,
                 extra={"message_type": "server"},
             )
-        elif code == server_error:
+            code = server_error
+
+        if code != ok_code:
+            self.reservations.release(request.reservation)
+
+        if code == server_error:
             self.logger.info(
                 "Error converting to mp3. User ID:",
                 extra={"message_type": "server"},
             )
-            self.bot.send_message(
+            self.__finish(
+                request.job_id,
                 request.user_id,
-                "Произошла ошибка. Попробуйте еще раз.",
+                "Произошла ошибка. Попробуйте еще раз.",
+            )
+
+        return code  # type: ignore[no-any-return]
+
+    def __reserve(
+        self: MainRoute,
+        job_id: str,
+        user_id: int,
+        price: int,
+    ) -> tuple[int, str]:
+        """Reserve the price of a note, telling the user if it fails."""
+        code, reservation = self.reservations.reserve(user_id, price)
+        if code == 403:  # noqa: PLR2004
+            self.__finish(
+                job_id,
+                user_id,
+                "Недостаточно средств.\nKyпить токены можно в меню /tokens",
             )
-        elif code == ok_code and request.request_type == "to_note":
-            with Path(f"{result_path}.md").open("rb") as md_document:
-                self.bot.send_document(request.user_id, md_document)
+            self.logger.info("Not enough tokens.", extra={"message_type": "server"})
+        elif code != 200:  # noqa: PLR2004
+            self.__finish(job_id, user_id, "Произошла ошибка. Попробуйте еще раз.")
+        return code, reservation
 
-            with Path(f"{result_path}.pdf").open("rb") as pdf_document:
-                self.bot.send_document(request.user_id, pdf_document)
+    def stop(self: MainRoute) -> None:
+        """Wait for the messages being admitted and the notes being delivered.
 
-            self.bot.send_message(
+        Called on shutdown after the queue is stopped and before the outbox,
+        so the last notes are sent and their reservations settled.
+        """
+        self.__intake.shutdown(wait=True)
+        self.__delivery.shutdown(wait=True)
+
+    def __note_prompts(self: MainRoute, prompt: str) -> tuple[Prompt, Prompt]:
+        """Return the map and reduce prompts of a note variant."""
+        return self.prompts.get(prompt), self.prompts.get("reduce")
+
+    def __tracker(self: MainRoute, job_id: str, user_id: int) -> ProgressTracker:
+        """Return the progress tracker of a job, creating it if needed."""
+        tracker = self.__progress.get(job_id)
+        if tracker is None:
+            tracker = self.__progress[job_id] = ProgressTracker(
+                self.outbox,
+                user_id,
+                self.logger,
+            )
+        return tracker
+
+    def __finish(self: MainRoute, job_id: str, user_id: int, text: str) -> None:
+        """End a job: show the text in its progress message, remove its files."""
+        Workspace(job_id).cleanup()
+        session = self.__sessions.pop(job_id, None)
+        if session is not None:
+            session[0].cancel()
+        tracker = self.__progress.pop(job_id, None)
+        if tracker is not None:
+            tracker.finish(text)
+        else:
+            self.outbox.send_message(user_id, text)
+
+    def __charge(self: MainRoute, reservation: str, user_id: int, price: int) -> str:
+        """Commit the reservation of a delivered note and return the balance report."""
+        code, balance = self.reservations.commit(reservation)
+        if code != 200:  # noqa: PLR2004
+            self.logger.warning(
+                "Failed to charge %s tokens to user %s, code %s.",
+                price,
+                user_id,
+                code,
+                extra={"message_type": "server"},
+            )
+            balance_line = ""
+        else:
+            balance_line = f"Осталось {balance} токенов\n"
+
+        return f"Потрачено {price} токенов\n{balance_line}Глaвнoe меню /start"
+
+    def __send_note(self: MainRoute, user_id: int, markdown: str, pdf: bytes) -> bool:
+        """Upload the note files from memory and wait until they are sent.
+
+        Args:
+        ----
+            user_id (int): ID of the user to send the note to.
+            markdown (str): Note in markdown.
+            pdf (bytes): Note rendered to PDF.
+
+        Returns:
+        -------
+            bool: Whether both files were sent.
+
+        """
+        result_name = f"{user_id}_{uuid.uuid4()}"
+        futures = [
+            self.outbox.send_document(
+                user_id,
+                telebot.types.InputFile(io.BytesIO(markdown.encode())),
+                visible_file_name=f"{result_name}.md",
+            ),
+            self.outbox.send_document(
+                user_id,
+                telebot.types.InputFile(io.BytesIO(pdf)),
+                visible_file_name=f"{result_name}.pdf",
+            ),
+        ]
+
+        try:
+            for future in futures:
+                future.result()
+        except Exception:
+            self.logger.exception(
+                "Error sending note.",
+                extra={"message_type": "server"},
+            )
+            return False
+        return True
+
+    def __deliver_note(
+        self: MainRoute,
+        request: Request,
+        user: User,
+        transcript: str,
+        markdown: str,
+        pdf_future: Future,
+    ) -> int:
+        """Wait for the rendered note, send it to the user and charge for it.
+
+        The reservation of the request is committed after delivery
+        and released if the note could not be rendered or sent.
+
+        Args:
+        ----
+            request (Request): Request to process.
+            user (User): User who sent the request.
+            transcript (str): Text of the audio.
+            markdown (str): Note in markdown.
+            pdf_future (Future): Future of the rendered PDF.
+
+        Returns:
+        -------
+            int: Response code.
+
+        """
+        price = self.__get_price(request.duration)
+
+        try:
+            pdf = pdf_future.result()
+        except EmptyMarkdownError:
+            self.reservations.release(request.reservation)
+            self.__finish(
+                request.job_id,
                 request.user_id,
-                f"Потрачено {price} токенов\nГлaвнoe меню /start",
+                "Произошла ошибка.\n"
+                "Возможно, данная запись не содержит ценной информации.\n"
+                "Главное меню /start",
             )
+            return 404
+        except Exception:
+            self.logger.exception(
+                "Error rendering note.",
+                extra={"message_type": "server"},
+            )
+            self.reservations.release(request.reservation)
+            self.__finish(
+                request.job_id,
+                request.user_id,
+                "Произошла ошибка. Попробуйте еще раз.",
+            )
+            return 500
 
-            self.database.decrease_tokens(user.id, price)
-            self.logger.info("Note sent", extra={"message_type": "server"})
+        # Kept even if sending fails, so a retry does not redo the work
+        if self.artifacts is not None:
+            self.artifacts.put(
+                request.file_unique_id,
+                self.__note_prompts(request.prompt),
+                Artifacts(
+                    duration=request.duration,
+                    transcript=transcript,
+                    markdown=markdown,
+                    pdf=pdf,
+                ),
+            )
 
-            Path(f"{result_path}.md").unlink()
-            Path(f"{result_path}.pdf").unlink()
+        if not self.__send_note(user.id, markdown, pdf):
+            self.reservations.release(request.reservation)
+            self.__finish(
+                request.job_id,
+                request.user_id,
+                "Произошла ошибка. Попробуйте еще раз.",
+            )
+            return 500
 
-            return 200
+        # Charged only once the note files are delivered
+        report = self.__charge(request.reservation, user.id, price)
+        self.__finish(request.job_id, request.user_id, f"Конспект готов.\n{report}")
+        self.logger.info("Note sent", extra={"message_type": "server"})
 
-        return code  # type: ignore[no-any-return]
+        return 200
 
     def __to_text(
         self: MainRoute,
         request: Request,
-        user: User,
     ) -> tuple[int, Request | None]:
         """Convert voice message to text and passes it to note route.
 
         This method downloads the file, converts it to mp3, divides it into chunks,
         converts each chunk to text, and then sends the text to the note route.
+        Transcripts of already seen audio and chunks are taken from the cache.
 
         Args:
         ----
             request (Request): Request to process.
-            user (User): User who sent the request.
 
         Returns:
         -------
             tuple[int, Optional[Request]]: Response code and new request to process.
 
         """
-        s2t_token = get_token(self.s2t_auth_data, "SALUTE_SPEECH_PERS")
         ok_code = 200
-        result = ""
+        tracker = self.__tracker(request.job_id, request.user_id)
+        workspace = Workspace(request.job_id).create()
 
+        tracker.stage("загрузка аудио")
         audio = self.bot.get_file(request.file_id)
-        file_path = f"data/audio/{request.file_name}"
-        price = self.__get_price(request.duration)
-
-        # Check if user has enough tokens to make the request
-        if price > user.tokens:
-            return 403, None
-
         file_data: bytes = self.bot.download_file(audio.file_path)
-        with Path(file_path).open("wb") as file:
-            file.write(file_data)
-
         self.logger.info("Note downloaded.", extra={"message_type": "server"})
 
-        # Convert to mp3
-        code, new_file_path = self.audio_pocessing.convert_to_mp3(file_path)
-        if code != ok_code:
-            return 500, None
-
-        # Convert to chunks
-        code = self.audio_pocessing.to_chunks(new_file_path, request.user_id)
-        if code != ok_code:
-            return 500, None
+        # Start summarizing while the rest of the audio is transcribed
+        if self.incremental_notes:
+            instructions, reduce_instructions = self.__note_prompts(request.prompt)
+            session = self.summarizer.session(
+                get_token(self.t2n_auth_data, "GIGACHAT_API_PERS"),
+                instructions,
+                reduce_instructions,
+            )
+            # Registered at once, so a failed job cancels its started map calls
+            self.__sessions[request.job_id] = (
+                session,
+                self.__new_segmenter(instructions),
+            )
 
-        # Convert each chunk to text
-        for filename in os.listdir(f"data/chunks/{request.user_id}"):
-            code, chunk_result = speech2text(
-                s2t_token,
-                f"data/chunks/{request.user_id}/{filename}",
-                self.logger,
+        # Same audio was already transcribed
+        audio_hash = content_hash(file_data)
+        cached = (
+            self.transcript_cache.get(audio_hash)
+            if self.transcript_cache is not None
+            else None
+        )
+        if cached is not None:
+            self.logger.info("Transcript cache hit.", extra={"message_type": "server"})
+            result = cached.decode()
+            self.__feed(request.job_id, result)
+        else:
+            code, result = self.__speech_to_text(
+                request,
+                workspace,
+                file_data,
+                tracker,
             )
             if code != ok_code:
                 return 500, None
-            result += chunk_result
+            if self.transcript_cache is not None:
+                self.transcript_cache.put(audio_hash, result.encode())
 
-        shutil.rmtree(f"data/chunks/{request.user_id}")
-        with Path(f"data/texts/{user.id}.txt").open("w") as f:
+        with workspace.text.open("w") as f:
             f.write(result)
             del result
 
         self.logger.info("Speech to text done.", extra={"message_type": "server"})
 
-        self.bot.send_message(
-            request.user_id,
-            "Получен текст.\nHaчинaeтcя создание конспекта...",
-        )
+        tracker.stage("текст получен, создание конспекта в очереди")
 
         # Create new request to note route
         new_request: Request = Request(
             user_id=request.user_id,
             request_type="to_note",
-            file_name=f"data/texts/{user.id}.txt",
+            file_name=str(workspace.text),
             duration=request.duration,
             file_id="",
+            file_unique_id=request.file_unique_id,
+            prompt=request.prompt,
+            reservation=request.reservation,
+            job_id=request.job_id,
         )
 
-        self.request_queue.put(new_request)
+        if not self.request_queue.put(new_request):
+            self.logger.info("Queue is full.", extra={"message_type": "server"})
+            return 500, None
 
         return 200, None
 
+    def __speech_to_text(
+        self: MainRoute,
+        request: Request,
+        workspace: Workspace,
+        file_data: bytes,
+        tracker: ProgressTracker,
+    ) -> tuple[int, str]:
+        """Transcribe downloaded audio chunk by chunk.
+
+        Transcribed chunks are fed to the summarization session of the job,
+        if it was started.
+
+        Args:
+        ----
+            request (Request): Request to process.
+            workspace (Workspace): Workspace of the job.
+            file_data (bytes): Downloaded audio.
+            tracker (ProgressTracker): Progress of the request.
+
+        Returns:
+        -------
+            tuple[int, str]: Response code and the transcript.
+
+        """
+        ok_code = 200
+        result = ""
+
+        tracker.stage("подготовка аудио")
+        file_path = str(workspace.audio(request.file_name))
+        with Path(file_path).open("wb") as file:
+            file.write(file_data)
+
+        # Convert to mp3
+        code, new_file_path = self.audio_pocessing.convert_to_mp3(file_path)
+        if code != ok_code:
+            return 500, ""
+
+        # Convert to chunks
+        code = self.audio_pocessing.to_chunks(new_file_path, workspace.chunks)
+        if code != ok_code:
+            return 500, ""
+
+        s2t_token = get_token(self.s2t_auth_data, "SALUTE_SPEECH_PERS")
+
+        # Convert each chunk to text, in audio order
+        chunk_paths = sorted(
+            workspace.chunks.iterdir(),
+            key=lambda path: int(path.stem),
+        )
+        tracker.stage("распознавание речи")
+        tracker.progress(0, len(chunk_paths))
+        if self.event_loop is not None:
+            code, result = self.event_loop.run(
+                self.__transcribe_async(
+                    request.job_id,
+                    chunk_paths,
+                    s2t_token,
+                    tracker,
+                ),
+            )
+            if code != ok_code:
+                return 500, ""
+            shutil.rmtree(workspace.chunks)
+            return 200, result
+
+        for done, chunk_path in enumerate(chunk_paths, start=1):
+            chunk_data, chunk_hash, chunk_result = self.__lookup_chunk(chunk_path)
+            if chunk_result is None:
+                code, chunk_result = self.speech_caller.call(
+                    speech2text,
+                    s2t_token,
+                    str(chunk_path),
+                    self.logger,
+                    payload_size=len(chunk_data),
+                )
+                if code != ok_code:
+                    return 500, ""
+                self.__store_chunk(chunk_hash, chunk_result)
+            result += chunk_result
+            tracker.progress(done, len(chunk_paths))
+            self.__feed(request.job_id, chunk_result)
+
+        shutil.rmtree(workspace.chunks)
+        return 200, result
+
+    def __lookup_chunk(
+        self: MainRoute,
+        chunk_path: Path,
+    ) -> tuple[bytes, str, str | None]:
+        """Read a chunk and look up its transcript in the cache.
+
+        Args:
+        ----
+            chunk_path (Path): Chunk file.
+
+        Returns:
+        -------
+            tuple[bytes, str, Optional[str]]: Chunk data, its hash and
+                the cached transcript, None on a miss.
+
+        """
+        chunk_data = chunk_path.read_bytes()
+        chunk_hash = content_hash(chunk_data)
+        cached = (
+            self.transcript_cache.get(chunk_hash)
+            if self.transcript_cache is not None
+            else None
+        )
+        return chunk_data, chunk_hash, cached.decode() if cached is not None else None
+
+    def __store_chunk(self: MainRoute, chunk_hash: str, transcript: str) -> None:
+        """Cache the transcript of a chunk."""
+        if self.transcript_cache is not None:
+            self.transcript_cache.put(chunk_hash, transcript.encode())
+
+    def __feed(self: MainRoute, job_id: str, text: str) -> None:
+        """Pass transcribed text to the summarization session of a job, if any."""
+        started = self.__sessions.get(job_id)
+        if started is not None:
+            session, segmenter = started
+            for segment in segmenter.feed(text):
+                session.add_segment(segment)
+
+    async def __transcribe_async(
+        self: MainRoute,
+        job_id: str,
+        chunk_paths: list[Path],
+        s2t_token: str,
+        tracker: ProgressTracker,
+    ) -> tuple[int, str]:
+        """Transcribe chunks concurrently on the event loop.
+
+        Up to `stt_concurrency` chunks are recognized at once. Results are
+        collected in audio order, so the session gets segments as soon as
+        all earlier chunks are done.
+
+        Args:
+        ----
+            job_id (str): ID of the job.
+            chunk_paths (list[Path]): Chunk files in audio order.
+            s2t_token (str): SaluteSpeech OAuth token.
+            tracker (ProgressTracker): Progress of the request.
+
+        Returns:
+        -------
+            tuple[int, str]: Response code and the transcript.
+
+        """
+        event_loop: EventLoopThread = self.event_loop  # type: ignore[assignment]
+        semaphore = asyncio.Semaphore(self.stt_concurrency)
+        done = 0
+
+        def report() -> None:
+            nonlocal done
+            done += 1
+            tracker.progress(done, len(chunk_paths))
+
+        async def transcribe(chunk_path: Path) -> tuple[int, str]:
+            chunk_data, chunk_hash, cached = await event_loop.offload(
+                self.__lookup_chunk,
+                chunk_path,
+            )
+            if cached is not None:
+                report()
+                return 200, cached
+
+            async with semaphore:
+                code, chunk_result = await self.speech_caller.acall(
+                    speech2text_async,
+                    event_loop.client,
+                    s2t_token,
+                    chunk_data,
+                    self.logger,
+                    payload_size=len(chunk_data),
+                )
+            report()
+            if code == 200:  # noqa: PLR2004
+                await event_loop.offload(self.__store_chunk, chunk_hash, chunk_result)
+            return code, chunk_result
+
+        tasks = [asyncio.ensure_future(transcribe(path)) for path in chunk_paths]
+        result = ""
+        try:
+            for task in tasks:
+                code, chunk_result = await task
+                if code != 200:  # noqa: PLR2004
+                    return code, ""
+                result += chunk_result
+                self.__feed(job_id, chunk_result)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return 200, result
+
     def __to_note(self: MainRoute, request: Request, user: User) -> tuple[int, str]:
         """Convert text to note using GigaChat's text-to-note API.
 
-        This method opens instructions.txt, reads it, opens the text file specified in the request,
-        reads it, and sends it to GigaChat's text-to-note API. If the request is successful,
-        the method creates a new file with the note and deletes the text file.
+        This method takes the instructions, opens the text file specified in the request,
+        splits it into segments, summarizes them concurrently with GigaChat's API and merges
+        the partial notes. If the summarization was started during speech to text,
+        the method only finishes it. If the request is successful, the method deletes
+        the text file and schedules rendering and delivery of the note.
 
         Args:
         ----
@@ -389,38 +919,72 @@ class MainRoute:
 
         Returns:
         -------
-            tuple[int, str]: Response code and path to the new file with the note.
+            tuple[int, str]: Response code and the note in markdown.
 
         """  # noqa: E501
         t2n_token = get_token(self.t2n_auth_data, "GIGACHAT_API_PERS")
-        result = ""
         ok_code = 200
 
-        with Path("data/instructions.txt").open() as f:
-            instructions = f.read()
+        # Show the final note in the chat while it is generated
+        live_message = (
+            LiveMessage(self.outbox, request.user_id, self.logger)
+            if self.stream_notes
+            else None
+        )
+        on_text = live_message.update if live_message is not None else None
+        tracker = self.__tracker(request.job_id, request.user_id)
+        tracker.stage("создание конспекта")
 
         with Path(request.file_name).open() as f:
             text = f.read()
 
-        text_substrings = self.split_string(text, 4096)
-        for text_substring in text_substrings:
-
-            code, ans = text2note(
+        if request.job_id in self.__sessions:
+            # The map step was started during speech to text
+            session, segmenter = self.__sessions.pop(request.job_id)
+            session.oauth_token = t2n_token
+            code, result = session.finish(
+                segmenter.flush(),
+                on_text,
+                tracker.progress,
+            )
+        else:
+            instructions = self.prompts.get(request.prompt)
+            reduce_instructions = self.prompts.get("reduce")
+            code, result = self.summarizer.summarize(
                 t2n_token,
+                self.__new_segmenter(instructions).split(text),
                 instructions,
-                self.logger,
-                text_substring,
+                reduce_instructions,
+                on_text=on_text,
+                on_progress=tracker.progress,
             )
-            if code != ok_code:
-                return 500, ""
-            result += ans
+
+        if live_message is not None:
+            live_message.flush()
+        if code != ok_code:
+            return 500, ""
 
         Path(request.file_name).unlink()
-        result_path = f"data/results/{user.id}_{uuid.uuid4()}"
 
-        with Path(f"{result_path}.md").open("w") as f:
-            f.write(result)
+        tracker.stage("создание PDF")
+        # Render off the queue thread, delivery waits for the render
+        self.__delivery.submit(
+            self.__deliver_note,
+            request,
+            user,
+            text,
+            result,
+            self.renderer.render(result),
+        )
 
-        md2pdf.core.md2pdf(f"{result_path}.pdf", result)
+        return 200, result
 
-        return 200, result_path
+    def __new_segmenter(self: MainRoute, instructions: Prompt) -> TranscriptSegmenter:
+        """Create a segmenter for requests with the given instructions."""
+        return TranscriptSegmenter(
+            token_budget(
+                self.context_tokens,
+                instructions.text,
+                self.completion_tokens,
+            ),
+        )
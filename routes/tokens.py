@@ -182,7 +182,7 @@ class TokensRoute:
         ok_code = 200
 
         _, amount, tokens = self.__get_price(ind)
-        code = self.database.increase_tokens(message.chat.id, tokens)
+        code, _ = self.database.increase_tokens(message.chat.id, tokens)
 
         if code != ok_code:
             self.bot.send_message(